@@ -0,0 +1,17 @@
+# coding: utf-8
+"""
+Benchmarks of data_importer readers and importers over generated files.
+
+Run from repository root:
+
+    python -m benchmarks.run --rows 100000 --output results.json --baseline baseline.json
+
+See benchmarks.run for options.
+"""
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(
+        INSTALLED_APPS=('data_importer',),
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3'}},
+    )
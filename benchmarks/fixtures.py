@@ -0,0 +1,101 @@
+# coding: utf-8
+import csv
+import datetime
+import os
+import random
+import openpyxl
+from data_importer.tests.cpfcnpj import CPFGenerator, CNPJGenerator
+
+try:
+    import xlwt
+except ImportError: # XLS files are written only if xlwt is installed
+    xlwt = None
+
+FORMATS = ('csv','xls','xlsx')
+# first columns of generated files, other columns are text
+COLUMNS = ['cpf','cnpj','name','amount','date']
+NAMES = [u'Luke Skywalker',u'Leia Organa',u'Han Solo',u'Obi-Wan Kenobi',u'Padmé Amidala',u'Lando Calrissian']
+
+def get_headers(columns):
+    return (COLUMNS + ['field%s' % c for c in range(len(COLUMNS),columns)])[:columns]
+
+def generate_rows(rows,columns,seed=0):
+    """
+    Yield rows of rows lines with columns values: valid CPF and CNPJ
+    numbers, names, decimals, dates and texts. A line in 50 have an
+    invalid CPF.
+    """
+    rnd = random.Random(seed)
+    random.seed(seed) # used by generators of cpfcnpj
+    cpfs = CPFGenerator(max(rows,2))
+    cnpjs = CNPJGenerator(max(rows,2))
+    start = datetime.date(2000,1,1)
+    for r in range(rows):
+        cpf = cpfs[r]
+        if r % 50 == 49:
+            cpf = cpf[:-1] + str((int(cpf[-1]) + 1) % 10)
+        row = [cpf,cnpjs[r],rnd.choice(NAMES),'%.2f' % (rnd.random() * 10000),
+            start + datetime.timedelta(days=rnd.randint(0,5000))]
+        for c in range(len(COLUMNS),columns):
+            row.append(u'text %s of line %s' % (c,r))
+        yield row[:columns]
+
+def write_csv(path,headers,rows):
+    f = open(path,'wb')
+    try:
+        writer = csv.writer(f,delimiter=';')
+        writer.writerow(headers)
+        for row in rows:
+            writer.writerow([value.strftime('%d/%m/%Y') if isinstance(value,datetime.date) else
+                (value.encode('utf-8') if isinstance(value,unicode) else value) for value in row])
+    finally:
+        f.close()
+
+def write_xls(path,headers,rows):
+    workbook = xlwt.Workbook(encoding='utf-8')
+    sheet = workbook.add_sheet('data')
+    date_style = xlwt.easyxf(num_format_str='DD/MM/YYYY')
+    for c,header in enumerate(headers):
+        sheet.write(0,c,header)
+    for r,row in enumerate(rows,1):
+        for c,value in enumerate(row):
+            if isinstance(value,datetime.date):
+                sheet.write(r,c,value,date_style)
+            else:
+                sheet.write(r,c,value)
+    workbook.save(path)
+
+def write_xlsx(path,headers,rows):
+    # optimized writer don't keep cells in memory
+    workbook = openpyxl.Workbook(optimized_write=True)
+    sheet = workbook.create_sheet()
+    sheet.append(headers)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+WRITERS = {
+    'csv': write_csv,
+    'xls': write_xls,
+    'xlsx': write_xlsx,
+}
+
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt != 'xls' or xlwt is not None]
+
+def generate(directory,fmt,rows,columns,seed=0):
+    """
+    Write a fmt file with rows lines and columns columns in directory,
+    created if needed, and return its path. Files already generated are
+    reused.
+    """
+    if fmt not in available_formats():
+        raise ValueError(u"Can't write %s files, is xlwt installed?" % fmt)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    path = os.path.join(directory,'bench_%s_%sx%s_%s.%s' % (fmt,rows,columns,seed,fmt))
+    if not os.path.exists(path):
+        tmp = path + '.tmp'
+        WRITERS[fmt](tmp,get_headers(columns),generate_rows(rows,columns,seed))
+        os.rename(tmp,path)
+    return path
@@ -0,0 +1,179 @@
+# coding: utf-8
+"""
+Time readers and importers over generated files.
+
+Each benchmark runs in its own process, so peak RSS is of that benchmark
+only. Results are written as JSON:
+
+    {"rows": 100000, "columns": 10, "benchmarks": {"read_csv": {"seconds": 1.2,
+    "rows_per_second": 83333.3, "peak_rss_kb": 30120}, ...}, "skipped": ["xls"]}
+
+Formats that can't be written, like XLS without xlwt, are listed in skipped.
+
+With --baseline, results are compared with a previous output and
+benchmarks slower than --tolerance make exit status 1.
+"""
+import benchmarks # configure django settings
+import json
+import multiprocessing
+import optparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from django.core.exceptions import ValidationError
+from django.utils.encoding import smart_unicode
+from data_importer import BaseImporter
+from data_importer.handlers import NullHandler
+from data_importer.readers import CSVReader, XLSReader, XLSXReader
+from data_importer.tests.cpfcnpj import CPF, CNPJ
+from benchmarks.fixtures import FORMATS, available_formats, generate, get_headers
+
+READERS = {
+    'csv': CSVReader,
+    'xls': XLSReader,
+    'xlsx': XLSXReader,
+}
+
+class BenchImporter(BaseImporter):
+    required_fields = ['cpf','cnpj']
+
+    def get_logger_handlers(self):
+        return [(NullHandler,(),{})]
+
+    def clean_cpf(self,val,row):
+        try:
+            return CPF(val)
+        except ValueError,msg:
+            raise ValidationError,smart_unicode(msg)
+
+    def clean_cnpj(self,val,row):
+        try:
+            return CNPJ(val)
+        except ValueError,msg:
+            raise ValidationError,smart_unicode(msg)
+
+def get_importer(columns,**attrs):
+    attrs['fields'] = get_headers(columns)
+    return type('BenchImporter',(BenchImporter,),attrs)
+
+def bench_read(path,fmt,columns):
+    return len(list(READERS[fmt](path)))
+
+def bench_validate(path,fmt,columns):
+    importer = get_importer(columns)(path)
+    importer.is_valid()
+    return len(importer.errors.lines)
+
+def bench_save(path,fmt,columns):
+    return len([row for row in get_importer(columns)(path).save_all() if row])
+
+BENCHMARKS = (
+    ('read',bench_read),
+    ('validate',bench_validate),
+    ('save',bench_save),
+)
+
+def _measure(conn,func,args):
+    start = time.time()
+    func(*args)
+    seconds = time.time() - start
+    # kilobytes in Linux, bytes in Mac OS X
+    conn.send((seconds,resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+    conn.close()
+
+def measure(func,*args):
+    """
+    Run func in a new process and return (seconds, peak RSS).
+    """
+    parent,child = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=_measure,args=(child,func,args))
+    process.start()
+    try:
+        result = parent.recv()
+    except EOFError:
+        raise RuntimeError(u"Benchmark %s failed" % func.__name__)
+    finally:
+        process.join()
+    return result
+
+def run(rows,columns,formats,directory,names=None,repeat=1):
+    results = {}
+    for fmt in formats:
+        path = generate(directory,fmt,rows,columns)
+        for name,func in BENCHMARKS:
+            key = '%s_%s' % (name,fmt)
+            if names and name not in names and key not in names:
+                continue
+            # best of repeat runs, less noisy than mean
+            seconds,rss = min([measure(func,path,fmt,columns) for r in range(repeat)])
+            results[key] = {
+                'seconds':seconds,
+                'rows_per_second':rows / seconds if seconds else 0.0,
+                'peak_rss_kb':rss,
+            }
+            print >> sys.stderr, '%-15s %8.2fs %10.0f rows/s %8s KB' % (key,seconds,results[key]['rows_per_second'],rss)
+    return {'rows':rows,'columns':columns,'benchmarks':results}
+
+def compare(results,baseline,tolerance):
+    """
+    Return list of (benchmark, baseline rows/s, rows/s, change) of
+    benchmarks present in both, and list of benchmarks slower than
+    tolerance (0.1 = 10%).
+    """
+    comparison,regressions = [],[]
+    for key,result in sorted(results['benchmarks'].items()):
+        base = baseline['benchmarks'].get(key)
+        if not base or not base['rows_per_second']:
+            continue
+        change = result['rows_per_second'] / base['rows_per_second'] - 1
+        comparison.append((key,base['rows_per_second'],result['rows_per_second'],change))
+        if change < -tolerance:
+            regressions.append(key)
+    return comparison,regressions
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage=u"python -m benchmarks.run [options] [benchmark ...]")
+    parser.add_option('--rows',type='int',default=10000)
+    parser.add_option('--columns',type='int',default=10)
+    parser.add_option('--formats',default=','.join(available_formats()),
+        help=u"comma separated, from %s" % ', '.join(available_formats()))
+    parser.add_option('--repeat',type='int',default=1)
+    parser.add_option('--fixtures',default=tempfile.gettempdir(),help=u"directory of generated files")
+    parser.add_option('--output',help=u"write results as JSON to this file")
+    parser.add_option('--baseline',help=u"JSON output of a previous run")
+    parser.add_option('--tolerance',type='float',default=0.1,help=u"slow down allowed, 0.1 = 10%")
+    options,names = parser.parse_args(argv)
+    skipped = [fmt for fmt in FORMATS if fmt not in available_formats()]
+    if skipped:
+        print >> sys.stderr, u"Skipped %s benchmarks, xlwt isn't installed." % ', '.join(skipped)
+
+    results = run(options.rows,options.columns,options.formats.split(','),options.fixtures,names,options.repeat)
+    results['skipped'] = skipped
+    if options.output:
+        f = open(options.output,'wb')
+        try:
+            json.dump(results,f,indent=2,sort_keys=True)
+        finally:
+            f.close()
+
+    if options.baseline and os.path.exists(options.baseline):
+        f = open(options.baseline,'rb')
+        try:
+            baseline = json.load(f)
+        finally:
+            f.close()
+        if (baseline['rows'],baseline['columns']) != (results['rows'],results['columns']):
+            print >> sys.stderr, u"Baseline was run with %sx%s files, results can't be compared." % (baseline['rows'],baseline['columns'])
+            return 1
+        comparison,regressions = compare(results,baseline,options.tolerance)
+        for key,base,current,change in comparison:
+            print >> sys.stderr, '%-15s %10.0f -> %10.0f rows/s %+6.1f%%%s' % (key,base,current,change * 100,
+                ' REGRESSION' if key in regressions else '')
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,5 +3,6 @@
 __version__='0.1.0-p3'
 
 from base import BaseImporter, ValidationError
+from model_importer import ModelImporter, BatchResult
 from readers import *
 from . import tests
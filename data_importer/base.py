@@ -1,20 +1,76 @@
 # coding: utf-8
 
 from django.conf import settings
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ValidationError, NON_FIELD_ERRORS
+from django.db import connections
 from django.db.models.fields.files import FieldFile
 from django.utils.datastructures import SortedDict
 from django.utils.encoding import smart_unicode
-from django.utils.translation import ugettext as _
+from django.utils.translation import ugettext as _, ugettext_noop
+from data_importer.checkpoints import Checkpoint, file_fingerprint
+from data_importer.errors import ErrorStore
 from data_importer.exceptions import UnknowSource
+from data_importer.handlers import RecordListHandler, BufferedDBLoggingHandler, QueueHandler, QueueListener, OVERFLOW_BLOCK
+from data_importer.metrics import LineSummary, Metrics, Timed, TimedLogger
+from data_importer.results import KEEP_ALL, KEEP_NONE, RESULTS_STORES
+from data_importer.spool import RowSpool
+from data_importer.unique import UniqueIndex
 from data_importer.readers import *
 import sys
 import traceback
 import logging
+import multiprocessing
+import threading
+from multiprocessing.pool import ThreadPool
+from collections import deque
+from functools import partial
+from Queue import Queue
+
+# messages logged or returned for each line, translated once per importer
+MESSAGES = {
+    'line_error': ugettext_noop(u"Line %(line)s, field %(field)s: %(err)s"),
+    'required': ugettext_noop(u"Field %s is required!"),
+    'saved': ugettext_noop(u"Line %s saved successfully"),
+    'lines_summary': ugettext_noop(u"Lines %(first)s to %(last)s: %(valid)s valid, %(invalid)s invalid, %(empty)s empty, %(saved)s saved"),
+}
 
 class FailedInStart(Exception):
     pass
 
+# importer used to clean lines in a worker process, see
+# BaseImporter._iter_parallel_results
+_worker_importer = None
+
+def _init_worker(klass,state,level):
+    global _worker_importer
+    _worker_importer = klass.get_worker(state,level)
+
+def _clean_chunk(chunk):
+    return _worker_importer._clean_chunk(chunk)
+
+def _close_thread_pool(pool,size):
+    """
+    Close database connections opened by each of size threads of pool,
+    then close and join it. Each thread runs one task, that wait others.
+    """
+    done = threading.Condition()
+    closed = [0]
+    def close_connections():
+        for connection in connections.all():
+            connection.close()
+        with done:
+            closed[0] += 1
+            done.notify_all()
+            while closed[0] < size:
+                done.wait()
+    try:
+        for result in [pool.apply_async(close_connections) for n in range(size)]:
+            result.get()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
 READERS_X_EXTENSIONS = {
     'csv': CSVReader,
     'xls': XLSReader,
@@ -24,23 +80,99 @@ READERS_X_EXTENSIONS = {
 # from django.core.validators.EMPTY_VALUES
 EMPTY_VALUES = (None, '', [], (), {})
 
+def error_message(err):
+    """
+    Return the message of a ValidationError, or err as unicode.
+    """
+    if isinstance(err,ValidationError):
+        return smart_unicode(err.messages[0])
+    return smart_unicode(err)
+
 class BaseImporter(object):
 
     fields = []
     required_fields = []
+    # {field: data_importer.lookups.Lookup}, fields that are keys of models
+    lookups = {}
+    # tuples of fields that should be unique in file, like
+    # [('cpf',),('name','birth')]. Only unique_index_size keys of each
+    # tuple are kept in memory, see data_importer.unique.UniqueIndex
+    unique_together = []
+    unique_index_size = 100000
     reader = None
     loaded = False
-    errors = SortedDict() # {lineNum:list(set([error1,error2])),...}
+    # details are kept only for the first max_error_lines failed lines, None
+    # keep all of them. See data_importer.errors.ErrorStore
+    max_error_lines = 1000
+    # what _clean keeps of each line: KEEP_ALL (cleaned rows), KEEP_FLAGS
+    # (only if line is valid) or KEEP_NONE. See data_importer.results
+    keep_validation_results = KEEP_ALL
+    # if True, is_valid() spool validated rows to a temporary file and
+    # save_all read them from there, so source file is read only once
+    spool_validated_rows = False
+    chunk_size = 1000
+    # clean lines in a pool of processes processes, None or 1 clean all
+    # lines in this process
+    processes = None
+    # clean lines of each chunk in a pool of threads threads, useful when
+    # clean_<field> methods wait for database or network. With
+    # concurrent_fields, cleaners of a line run concurrently too and each
+    # one see the line before cleaning
+    threads = None
+    concurrent_fields = False
+    # call save in a pool of save_threads threads, None or 1 save lines
+    # one by one in this thread
+    save_threads = None
+    # with a checkpoint store (see get_checkpoint_store), BaseImporter save a
+    # checkpoint each checkpoint_interval saved lines
+    checkpoint_interval = 1000
+    # collect time of each stage and counters of lines in self.metrics, and
+    # call on_metrics each metrics_interval seconds. See data_importer.metrics
+    collect_metrics = False
+    metrics_interval = 10
+    # handle log records in a thread, through a queue of log_queue_size
+    # records. When queue is full log_overflow choose if importer wait
+    # (OVERFLOW_BLOCK), drop DEBUG and INFO records (OVERFLOW_DROP) or
+    # keep one in log_sample of them (OVERFLOW_SAMPLE)
+    log_queue_size = None
+    log_overflow = OVERFLOW_BLOCK
+    log_sample = 10
+    # log one summary each log_aggregate lines instead of one message for
+    # each error, empty line and saved line. Errors are still in self.errors
+    log_aggregate = None
+    # reader read only columns of fields and required_fields, so other
+    # columns of file aren't converted nor normalized. Rows given to
+    # clean_<field> and save have only these fields
+    read_fields_only = False
 
     def __init__(self,import_file,reader=None,reader_kwargs={}):
-        self._validation_results = SortedDict()
+        self._validation_results = RESULTS_STORES[self.keep_validation_results]()
+        self._cleaned = False
+        self._spool = None
+        self._field_pool = None
+        self.errors = ErrorStore(self.max_error_lines) # {lineNum:{field:[error1,error2]}),...}
+        self._validation_plan = None
+        self._batch_plan = None
+        self._unique_indexes = []
+        self._checkpoint_store = None
+        self._checkpoint = None
+        self._first_line = 1
+        self.metrics = None
+        self._summary = None
+        self._messages = dict([(key,_(msg)) for key,msg in MESSAGES.items()])
         self.set_logger()
         self._load(import_file)
         self.reader = self._get_reader(reader,reader_kwargs)
         assert self._validate_class() is True # do not remove this line!!!!
+        if self.read_fields_only:
+            self.reader.set_fields(self.get_read_fields())
         if settings.DEBUG:
             self.logger.setLevel(logging.DEBUG)
         else:self.logger.setLevel(logging.INFO)
+        if self.collect_metrics:
+            self.start_metrics()
+        if self.log_aggregate:
+            self._summary = LineSummary(self.logger,self.log_aggregate,self._messages['lines_summary'])
 
     def _validate_class(self):
         """
@@ -105,17 +237,30 @@ class BaseImporter(object):
 
         self.logger = logging.getLogger('%s_importer' % self.__class__.__name__)
         # remove handlers that can come with logger
-        for h in self.logger.handlers:
+        if self.logger.handlers is self.logger.parent.handlers:
+            # handlers of parent, set by other importer without handlers
+            self.logger.handlers = []
+        for h in list(self.logger.handlers):
             self.logger.removeHandler(h)
+            if isinstance(h,(QueueHandler,BufferedDBLoggingHandler)):
+                h.close() # stop threads of other importer
         self.logger.propagate = False
 
         # set defined handlers as defined in self.get_logger_handlers
         for h,hargs,hkwargs in handlers:
             self.logger.addHandler(h(*hargs,**hkwargs))
 
-        if not self.logger.handlers:
+        owned = bool(self.logger.handlers)
+        if not owned:
             self.logger.handlers = self.logger.parent.handlers
 
+        if self.log_queue_size:
+            queue = Queue(self.log_queue_size)
+            # handlers of parent aren't closed with the listener
+            listener = QueueListener(queue,*self.logger.handlers,close_handlers=owned)
+            listener.start()
+            self.logger.handlers = [QueueHandler(queue,self.log_overflow,self.log_sample,listener)]
+
         try:
             if settings.DEBUG:
                 self.logger.setLevel(logging.DEBUG)
@@ -136,22 +281,424 @@ class BaseImporter(object):
         """
         raise NotImplementedError
 
-    def is_valid(self):
-        if not self._validation_results:
+    def start_metrics(self):
+        """
+        Start collecting metrics: time reader, logger, save and cleaners.
+        """
+        self.metrics = Metrics()
+        self.reader.get_item = Timed(self.metrics,'get_item',self.reader.get_item)
+        self.logger = TimedLogger(self.logger,self.metrics)
+        for name in ('save','save_batch'):
+            if hasattr(self,name):
+                setattr(self,name,Timed(self.metrics,'save',getattr(self,name)))
+        self._validation_plan = None
+        self._batch_plan = None
+
+    def on_metrics(self,summary):
+        """
+        Called with self.metrics.summary() each metrics_interval seconds
+        while lines are read and at end of save_all.
+        """
+        raise NotImplementedError
+
+    def report_metrics(self):
+        try:
+            self.on_metrics(self.metrics.summary())
+        except NotImplementedError:
+            pass
+
+    def _iter_rows(self):
+        """
+        Yield (line, row) from reader.
+        """
+        rows = enumerate(self.reader,self._first_line)
+        if self.metrics is None:
+            return rows
+        return self.metrics.iter_rows(rows,self.report_metrics,self.metrics_interval)
+
+    def get_read_fields(self):
+        """
+        Columns read from file when read_fields_only is True.
+        """
+        return list(self.fields) + [field for field in self.required_fields if field not in self.fields]
+
+    def get_checkpoint_store(self):
+        """
+        Return a data_importer.checkpoints store, like
+        FileCheckpointStore('/var/run/imports.json') or ModelCheckpointStore().
+        save_all save there the last line saved and, if the same file is
+        imported again after a failure, skip lines already saved.
+        """
+        raise NotImplementedError
+
+    def start_checkpoints(self):
+        """
+        Load checkpoint of import file and fast forward reader to the first
+        line not saved.
+        """
+        try:
+            self._checkpoint_store = self.get_checkpoint_store()
+        except NotImplementedError:
+            return
+        self._fingerprint = file_fingerprint(self.import_file.name)
+        self._checkpoint = self._checkpoint_store.load(self._fingerprint)
+        if self._checkpoint is not None:
+            self.logger.info(_(u"Resuming import after line %s"),self._checkpoint.line)
+            self.reader.skip(self._checkpoint.line)
+            self._first_line = self._checkpoint.line + 1
+
+    def checkpoint(self,line,batch=None):
+        """
+        Save line as the last line saved.
+        """
+        if self._checkpoint_store is not None:
+            self._checkpoint = Checkpoint(self._fingerprint,line,batch)
+            self._checkpoint_store.save(self._checkpoint)
+
+    def finish_checkpoints(self):
+        # all lines saved, next import of this file start from first line
+        if self._checkpoint_store is not None:
+            self._checkpoint_store.clear(self._fingerprint)
+            self._checkpoint_store = None
+            self._checkpoint = None
+
+    @classmethod
+    def compile_validation_plan(cls,fields,required_fields):
+        """
+        Return a tuple of (field, required, cleaner name) in the order fields
+        are validated: fields first and after required fields that aren't
+        in fields. Cleaner name is None if class doesn't have a
+        clean_<field> method.
+        """
+        required = set(required_fields)
+        plan = []
+        for field in list(fields) + [f for f in required_fields if f not in fields]:
+            cleaner = 'clean_%s' % field
+            plan.append((field,field in required,cleaner if hasattr(cls,cleaner) else None))
+        return tuple(plan)
+
+    @classmethod
+    def get_validation_plan(cls):
+        """
+        Validation plan of class, compiled only once per class.
+        """
+        if '_class_validation_plan' not in cls.__dict__:
+            cls._class_validation_plan = cls.compile_validation_plan(cls.fields,cls.required_fields)
+        return cls._class_validation_plan
+
+    @property
+    def validation_plan(self):
+        """
+        List of (field, required, bound cleaner) used by _clean, so it don't
+        look for clean_<field> methods for each line.
+        """
+        if self._validation_plan is None:
+            cls = self.__class__
+            if self.fields is cls.fields and self.required_fields is cls.required_fields:
+                plan = cls.get_validation_plan()
+            else: # fields changed in instance
+                plan = cls.compile_validation_plan(self.fields,self.required_fields)
+            self._validation_plan = [(field,required,getattr(self,cleaner) if cleaner else None)
+                for field,required,cleaner in plan]
+            if self.metrics is not None:
+                self._validation_plan = [(field,required,Timed(self.metrics,'clean_%s' % field,cleaner) if cleaner else None)
+                    for field,required,cleaner in self._validation_plan]
+        return self._validation_plan
+
+    @property
+    def batch_plan(self):
+        """
+        List of (field, required, bound clean_<field>_batch) for fields that
+        have a batch cleaner.
+
+        A batch cleaner receive values of field and its line numbers for a
+        chunk of lines and should return a list with one cleaned value for
+        each value. To invalidate a line put a ValidationError instance in
+        place of its value; a raised ValidationError invalidates all lines of
+        the chunk. Per line cleaners run after and receive value returned by
+        batch cleaner.
+
+        Fields in self.lookups use the batch cleaner of its Lookup.
+        """
+        if self._batch_plan is None:
+            self._batch_plan = []
+            for field,required,cleaner in self.validation_plan:
+                if field in self.lookups:
+                    lookup = self.lookups[field]
+                    # each importer have its own cache of keys
+                    batch_cleaner = partial(lookup.clean,cache=lookup.get_cache())
+                else:
+                    batch_cleaner = getattr(self,'clean_%s_batch' % field,None)
+                if batch_cleaner is not None:
+                    if self.metrics is not None:
+                        batch_cleaner = Timed(self.metrics,'clean_%s_batch' % field,batch_cleaner)
+                    self._batch_plan.append((field,required,batch_cleaner))
+        return self._batch_plan
+
+    def is_valid(self,line=None):
+        """
+        Return True if all lines are valid, or only line if it's given.
+        """
+        if not self._cleaned:
             self._clean_all()
+        if line is not None:
+            return not self.errors.has_line(line)
         return not self.errors
 
+    def _reset_errors(self):
+        # invalid lines cached in self._validation_results aren't cleaned
+        # again, so we keep their errors
+        if not self._cleaned or self.keep_validation_results == KEEP_NONE:
+            self.errors = ErrorStore(self.max_error_lines)
+            if self.metrics is not None:
+                self.metrics.reset_counters(('valid','invalid','empty'))
+            for fields,index in self._unique_indexes:
+                index.close()
+            self._unique_indexes = [(tuple(fields),UniqueIndex(self.unique_index_size))
+                for fields in self.unique_together]
+
     def _clean_all(self):
-        self.errors = SortedDict()
-        for i,row in enumerate(self.reader,1):
-            self._clean(i,row)
+        self._reset_errors()
+        if self.spool_validated_rows:
+            spool = RowSpool(self.chunk_size)
+            for i,row in self._iter_results():
+                spool.append(i,row)
+            spool.finish()
+            self._spool = spool
+        else:
+            for i,row in self._iter_results():
+                pass
+        if self._summary is not None:
+            self._summary.flush()
+        self._cleaned = True
 
     def _iter_clean_all(self):
-        self.errors = SortedDict()
-        for i,row in enumerate(self.reader,1):
-            yield i,self._clean(i,row)
+        if self._spool is not None:
+            # rows already validated by is_valid()
+            for i,row in self._spool:
+                if i >= self._first_line:
+                    yield i,row
+            return
+
+        self._reset_errors()
+        for i,row in self._iter_results():
+            yield i,row
+        self._cleaned = True
+
+    def _iter_results(self):
+        """
+        Clean all lines of reader and yield (line, result of self._clean).
+        """
+        if self.processes and self.processes > 1:
+            return self._iter_parallel_results()
+        if self.threads and self.threads > 1:
+            return self._iter_threaded_results()
+        if self.batch_plan:
+            return self._iter_batched_results()
+        return ((i,self._clean(i,row)) for i,row in self._iter_rows())
+
+    def _iter_batched_results(self):
+        for chunk in self._iter_chunks():
+            batch = self._clean_batch(chunk)
+            for i,row in chunk:
+                yield i,self._clean(i,row,batch.get(i))
+
+    def _iter_chunks(self):
+        """
+        Yield lists of chunk_size (line, row) from reader. Row is None for
+        lines already cleaned.
+        """
+        chunk = []
+        for i,row in self._iter_rows():
+            if self._validation_results.get(i) is not None:
+                row = None
+            chunk.append((i,row))
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _iter_parallel_results(self):
+        """
+        Send chunks of lines to be cleaned by a pool of self.processes
+        processes and merge results in line order. Errors are registered
+        and logged here, and log records of workers are handled by
+        self.logger in line order too, like if lines were cleaned here.
+
+        Workers are forked from this process, so if your clean_<field>
+        methods use the database take care with connections shared with the
+        parent process.
+        """
+        pool = multiprocessing.Pool(self.processes,_init_worker,
+            (self.__class__,self.get_worker_state(),self.logger.getEffectiveLevel()))
+        try:
+            pending = deque()
+            for chunk in self._iter_chunks():
+                pending.append(pool.apply_async(_clean_chunk,(chunk,)))
+                # don't read the whole file while workers are busy
+                if len(pending) >= self.processes * 2:
+                    for item in self._merge_chunk(pending.popleft().get()):
+                        yield item
+            while pending:
+                for item in self._merge_chunk(pending.popleft().get()):
+                    yield item
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _iter_threaded_results(self):
+        """
+        Clean lines of each chunk in a pool of self.threads threads. Results
+        are registered and logged here in line order, but messages logged
+        by clean_<field> methods are logged by the threads as they run.
+
+        Each thread use its own database connection, closed when cleaning ends.
+        """
+        pool = ThreadPool(self.threads)
+        if self.concurrent_fields:
+            self._field_pool = ThreadPool(self.threads)
+        try:
+            pending = deque()
+            for chunk in self._iter_chunks():
+                batch = self._clean_batch(chunk)
+                items = [(i,row,batch.get(i)) for i,row in chunk]
+                pending.append((chunk,pool.map_async(self._clean_threaded,items)))
+                if len(pending) >= 2:
+                    for item in self._merge_threaded_chunk(*pending.popleft()):
+                        yield item
+            while pending:
+                for item in self._merge_threaded_chunk(*pending.popleft()):
+                    yield item
+        finally:
+            _close_thread_pool(pool,self.threads)
+            if self._field_pool is not None:
+                _close_thread_pool(self._field_pool,self.threads)
+                self._field_pool = None
+
+    def _clean_threaded(self,item):
+        i,row,batch = item
+        if row is None or not any(row.itervalues()):
+            return None
+        return self._clean_row(i,row,batch)
+
+    def _merge_threaded_chunk(self,chunk,async_result):
+        for (i,_row),result in zip(chunk,async_result.get()):
+            cached = self._validation_results.get(i)
+            if cached is not None:
+                yield i,cached
+            elif result is None: # empty line
+                self._is_empty(i,_row)
+                yield i,None
+            else:
+                yield i,self._record(i,*result)
+
+    def _merge_chunk(self,results):
+        for i,row,line_errors,records in results:
+            for record in records:
+                self.logger.handle(record)
+            cached = self._validation_results.get(i)
+            if cached is not None:
+                yield i,cached
+            elif row is None: # empty line
+                if self.metrics is not None:
+                    self.metrics.incr('empty')
+                if self._summary is not None:
+                    self._summary.add(i,'empty')
+                yield i,None
+            else:
+                yield i,self._record(i,row,line_errors)
 
-    def _clean(self,i,_row):
+    def get_worker_state(self):
+        """
+        Return attributes that should be copied to importers in worker
+        processes. Customize it if your importer have attributes that can't
+        be pickled.
+        """
+        exclude = set(['reader','import_file','logger','errors','_validation_results',
+            '_validation_plan','_batch_plan','_spool','_field_pool','_unique_indexes','_checkpoint_store',
+            'metrics','_summary'])
+        # methods timed by metrics are timed only in parent
+        return dict([(k,v) for k,v in self.__dict__.items() if k not in exclude and not isinstance(v,Timed)])
+
+    @classmethod
+    def get_worker(cls,state,level):
+        """
+        Build importer used to clean lines in a worker process, without
+        source file. Log records are collected to be handled by parent.
+        """
+        importer = cls.__new__(cls)
+        importer.__dict__.update(state)
+        importer._validation_plan = None
+        importer._batch_plan = None
+        importer._field_pool = None
+        importer.metrics = None
+        importer._summary = None
+        importer.logger = logging.Logger('%s_importer' % cls.__name__,level)
+        importer.logger.addHandler(RecordListHandler())
+        return importer
+
+    def _clean_chunk(self,chunk):
+        """
+        Clean a list of (line, row) in a worker and return a list of
+        (line, row, line_errors, log records). Row is None for empty lines
+        and lines already cleaned.
+        """
+        collector = self.logger.handlers[0]
+        batch = self._clean_batch(chunk)
+        results = []
+        for i,row in chunk:
+            line_errors = None
+            if row is not None:
+                if self._is_empty(i,row):
+                    row = None
+                else:
+                    row,line_errors = self._clean_row(i,row,batch.get(i))
+            results.append((i,row,line_errors,collector.pop()))
+        return results
+
+    def _is_empty(self,i,row):
+        if not any(row.itervalues()):
+            if self._summary is not None:
+                self._summary.add(i,'empty')
+            elif not self.log_aggregate and self.logger.isEnabledFor(logging.WARNING):
+                # workers of log_aggregate importers don't log, parent count
+                self.logger.warning(u"Linha %s é vazia, foi ignorada.",i)
+            if self.metrics is not None:
+                self.metrics.incr('empty')
+            return True
+        return False
+
+    def _clean_batch(self,chunk):
+        """
+        Run batch cleaners over a chunk of (line, row) and return a dict
+        {line: {field: cleaned value or ValidationError}}. Cached, empty
+        lines and empty required values aren't sent to batch cleaners.
+        """
+        results = {}
+        if not self.batch_plan:
+            return results
+        rows = [(i,row) for i,row in chunk if row is not None and any(row.itervalues())]
+        for field,required,batch_cleaner in self.batch_plan:
+            lines,values = [],[]
+            for i,row in rows:
+                value = row.get(field,u'')
+                if required and value in EMPTY_VALUES:
+                    continue
+                lines.append(i)
+                values.append(value)
+            if not lines:
+                continue
+            try:
+                cleaned = batch_cleaner(values,lines)
+            except ValidationError, err:
+                cleaned = [err] * len(lines)
+            for i,value in zip(lines,cleaned):
+                results.setdefault(i,{})[field] = value
+        return results
+
+    def _clean(self,i,_row,batch=None):
         """
         Walk over all fields in a row and validate it. Validations will be cached.
 
@@ -169,79 +716,156 @@ class BaseImporter(object):
         This method should be called by self._clean_all
 
         """
-        if i in self._validation_results:
-            return self._validation_results[i]
+        cached = self._validation_results.get(i)
+        if cached is not None:
+            return cached
 
-        if not any(_row.values()):
-            self.logger.warning(u"Linha %s é vazia, foi ignorada." % i)
+        if self._is_empty(i,_row):
             return
 
+        row,line_errors = self._clean_row(i,_row,batch)
+        return self._record(i,row,line_errors)
+
+    def _clean_row(self,i,_row,batch=None):
+        """
+        Run validation plan over row and return cleaned row and a dict with
+        errors of each field. Don't change importer state, so it can run
+        in other processes or threads.
+        """
         line_errors = SortedDict()
+        # rows from readers are copy on write, so copies are cheap until a
+        # value really changes
         row = _row.copy()
         row['_i'] = i
 
-        def append_error(field,msg):
-            if i not in self.errors:
-                self.errors[i] = []
-            if isinstance(msg,ValidationError):
-                self.errors[i] = list(set(self.errors[i]+map(smart_unicode,msg.messages)))
-                return map(smart_unicode,msg.messages)[0]
-            else:
-                self.errors[i] = list(set(self.errors[i] + [smart_unicode(msg)]))
-                return smart_unicode(msg)
-
-        # validate required fields first
-        for field in self.required_fields:
-            if row[field] in EMPTY_VALUES:
-                if field not in line_errors:
-                    line_errors[field] = [append_error(field,_(u"Field %s is required!") % field)]
-                else:
-                    line_errors[field].append(append_error(field,_(u"Field %s is required!") % field))
-                continue
-        # now validate each field
-        for field in self.fields:
-
-            if field in line_errors:
-                continue
+        concurrent = []
+        for field,required,cleaner in self.validation_plan:
             if field not in row:
                 row[field] = u''
-            if hasattr(self,'clean_%s' % field):
-                try:
-                    val = getattr(self,'clean_%s' % field)(row[field],row.copy())
+            if required and row[field] in EMPTY_VALUES:
+                line_errors[field] = [self._messages['required'] % field]
+                continue
+            if batch and field in batch:
+                val = batch[field]
+                if isinstance(val,ValidationError):
+                    line_errors[field] = [error_message(val)]
+                    continue
+                if val is not row[field]:
                     row[field] = val
+            if cleaner is not None:
+                if self._field_pool is not None:
+                    concurrent.append((field,cleaner))
+                    continue
+                try:
+                    val = cleaner(row[field],row.copy())
+                    if val is not row[field]:
+                        row[field] = val
                 except ValidationError, msg:
-                    if field not in line_errors:
-                        line_errors[field] = [append_error(field,msg)]
-                    else:
-                        line_errors[field].append(append_error(field,msg))
+                    line_errors[field] = [error_message(msg)]
+
+        if concurrent:
+            row,line_errors = self._clean_fields_concurrently(row,line_errors,concurrent)
+
+        return row,line_errors
+
+    def _clean_fields_concurrently(self,row,line_errors,cleaners):
+        # copy freezes row values, so threads can copy it without writes
+        frozen = row.copy()
+        def run(item):
+            field,cleaner = item
+            try:
+                return True,cleaner(frozen[field],frozen.copy())
+            except ValidationError, msg:
+                return False,error_message(msg)
+
+        for (field,cleaner),(valid,val) in zip(cleaners,self._field_pool.map(run,cleaners)):
+            if not valid:
+                line_errors[field] = [val]
+            elif val is not row[field]:
+                row[field] = val
+
+        # keep errors in fields order, like when cleaned one by one
+        ordered = SortedDict()
+        for field,required,cleaner in self.validation_plan:
+            if field in line_errors:
+                ordered[field] = line_errors[field]
+        return row,ordered
+
+    def _record(self,i,row,line_errors):
+        """
+        Register result of a cleaned line: cache it, register and log
+        errors. Return row if line is valid, else False.
+        """
+        if not line_errors and self._unique_indexes:
+            line_errors = self._check_unique(i,row)
 
         if line_errors:
-            self.errors[i] = line_errors.copy()
+            line_errors = self.errors.add(i,line_errors)
             self._validation_results[i] = False
-            for field,error in line_errors.items():
-                for errmsg in error:
-                    self.logger.error(_("Line %(line)s, field %(field)s: %(err)s") % {'line':i,'field':field,'err':errmsg})
+            if self._summary is not None:
+                self._summary.add(i,'invalid')
+            elif self.logger.isEnabledFor(logging.ERROR):
+                template = self._messages['line_error']
+                for field,error in line_errors.items():
+                    for errmsg in error:
+                        self.logger.error(template,{'line':i,'field':field,'err':errmsg})
+            if self.metrics is not None:
+                self.metrics.incr('invalid')
             return False
 
         self._validation_results[i] = row
+        if self._summary is not None:
+            self._summary.add(i,'valid')
+        if self.metrics is not None:
+            self.metrics.incr('valid')
         return row
 
+    def _check_unique(self,i,row):
+        """
+        Return errors for keys of row already seen in other lines. Keys with
+        empty values aren't checked.
+        """
+        line_errors = SortedDict()
+        for fields,index in self._unique_indexes:
+            key = tuple([row.get(field) for field in fields])
+            if any([value in EMPTY_VALUES for value in key]):
+                continue
+            first = index.check(key,i)
+            if first != i:
+                field = fields[0] if len(fields) == 1 else NON_FIELD_ERRORS
+                line_errors[field] = [_(u"Duplicated %(fields)s, first seen in line %(line)s.") % {
+                    'fields':', '.join(fields),'line':first}]
+        return line_errors
+
     def save_all_iter(self):
         return self.save_all(use_generator=True)
 
     def save_all(self,use_generator=False):
         try:
+            self.start_checkpoints()
+            if self._summary is not None:
+                self._summary.saving = True
             if use_generator:
                 def save_gen(self):
-                    for i,row in self._iter_clean_all():
-                        yield self.save(i,row)
+                    try:
+                        for result in self._iter_measured_saves():
+                            yield result
+                    finally:
+                        self.close_spool()
+                    self.finish_checkpoints()
+                    self.finish_metrics()
+                    self.flush_logger()
                     try:
                         self.post_save_all()
                     except NotImplementedError:
                         pass
                 return save_gen(self)
             else:
-                rows = [self.save(i,row) for i,row in self._iter_clean_all()]
+                rows = list(self._iter_measured_saves())
+                self.close_spool()
+                self.finish_checkpoints()
+                self.finish_metrics()
+                self.flush_logger()
                 try:
                     self.post_save_all()
                 except NotImplementedError:
@@ -251,7 +875,101 @@ class BaseImporter(object):
             exc_info = sys.exc_info()
             self.logger.debug(self.logger.debug("\n".join(traceback.format_exception(*exc_info))))
             self.logger.critical(_("Process stoped with error %s: %s."),err.__class__.__name__, err)
+            self.close_spool()
+            self.flush_logger()
+
+    def close_spool(self):
+        """
+        Remove spool of validated rows, its rows were read by save_all.
+        """
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
 
+    def flush_logger(self):
+        """
+        Write records kept by buffered handlers, like BufferedDBLoggingHandler.
+        """
+        if self._summary is not None:
+            self._summary.flush()
+        for handler in self.logger.handlers:
+            handler.flush()
+
+    def _iter_measured_saves(self):
+        if self.metrics is None:
+            return self._iter_saved()
+        return self._count_saved(self._iter_saved())
+
+    def _count_saved(self,results):
+        for result in results:
+            self.metrics.incr('saved',self.count_saved(result))
+            yield result
+
+    def count_saved(self,result):
+        """
+        Number of lines saved by a result of save.
+        """
+        return 1 if result else 0
+
+    def finish_metrics(self):
+        if self.metrics is not None:
+            summary = self.metrics.summary()
+            self.logger.info(_(u"%(rows)s lines read in %(elapsed).1f seconds (%(rate).0f lines/s), %(saved)s saved") % {
+                'rows':summary['rows'],'elapsed':summary['elapsed'],'rate':summary['rows_per_second'],
+                'saved':summary['counters']['saved']})
+            self.report_metrics()
+
+    def _iter_saved(self):
+        """
+        Yield result of self.save for each cleaned line, in line order.
+        """
+        if self.save_threads and self.save_threads > 1:
+            return self._iter_threaded_saves()
+        if self._checkpoint_store is None and self._summary is None:
+            return (self.save(i,row) for i,row in self._iter_clean_all())
+        return self._iter_tracked_saves()
+
+    def _iter_tracked_saves(self):
+        for i,row in self._iter_clean_all():
+            result = self.save(i,row)
+            self._line_saved(i,result)
+            yield result
+
+    def _line_saved(self,i,result):
+        """
+        Count line in summary and checkpoint it. Called in main thread with
+        lines in order, also when save runs in threads.
+        """
+        if self._summary is not None:
+            if result:
+                self._summary.add(i,'saved')
+            self._summary.done(i)
+        if self._checkpoint_store is not None and i % self.checkpoint_interval == 0:
+            # lines before i were saved too, results are taken in line order
+            self.checkpoint(i)
+
+    def _iter_threaded_saves(self):
+        """
+        Call self.save in a pool of self.save_threads threads, so saves that
+        wait for database or network overlap. At most 2 * save_threads lines
+        wait to be saved and results are yielded in line order.
+        """
+        pool = ThreadPool(self.save_threads)
+        try:
+            pending = deque()
+            for i,row in self._iter_clean_all():
+                pending.append((i,pool.apply_async(self.save,(i,row))))
+                if len(pending) >= self.save_threads * 2:
+                    yield self._saved(*pending.popleft())
+            while pending:
+                yield self._saved(*pending.popleft())
+        finally:
+            _close_thread_pool(pool,self.save_threads)
+
+    def _saved(self,i,async_result):
+        result = async_result.get()
+        self._line_saved(i,result)
+        return result
 
     def save(self,i,row):
         """
@@ -259,7 +977,8 @@ class BaseImporter(object):
         The default one just return row.
         """
         if row:
-            self.logger.info(_(u"Line %s saved successfully"),i)
+            if self._summary is None and self.logger.isEnabledFor(logging.INFO):
+                self.logger.info(self._messages['saved'],i)
             return row
 
     def post_save_all(self):
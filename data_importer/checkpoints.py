@@ -0,0 +1,122 @@
+# coding: utf-8
+import os
+import hashlib
+import json
+import tempfile
+from collections import namedtuple
+
+# last line committed by save_all of the file with fingerprint
+Checkpoint = namedtuple('Checkpoint','fingerprint line batch')
+
+def file_fingerprint(name,block_size=65536):
+    """
+    Identify a file by md5 of its content, so a checkpoint isn't used for
+    other file, even one of same size that differs only in the middle.
+    """
+    md5 = hashlib.md5()
+    f = open(name,'rb')
+    try:
+        block = f.read(block_size)
+        while block:
+            md5.update(block)
+            block = f.read(block_size)
+    finally:
+        f.close()
+    return md5.hexdigest()
+
+class BaseCheckpointStore(object):
+    """
+    Keep the last Checkpoint of each file. Checkpoints of transactional
+    stores are saved inside the transaction of a batch, others after it
+    commits.
+    """
+    transactional = False
+
+    def load(self,fingerprint):
+        """
+        Return Checkpoint of file or None.
+        """
+        raise NotImplementedError
+
+    def save(self,checkpoint):
+        raise NotImplementedError
+
+    def clear(self,fingerprint):
+        raise NotImplementedError
+
+class FileCheckpointStore(BaseCheckpointStore):
+    """
+    Keep checkpoints in a local JSON file, {fingerprint: [line, batch]}. File
+    is replaced atomically, so a crash while saving keeps the old checkpoint.
+    """
+
+    def __init__(self,path):
+        self.path = path
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return {}
+        f = open(self.path,'rb')
+        try:
+            return json.load(f)
+        finally:
+            f.close()
+
+    def write(self,data):
+        fd,tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)))
+        f = os.fdopen(fd,'wb')
+        try:
+            json.dump(data,f)
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+        os.rename(tmp,self.path)
+
+    def load(self,fingerprint):
+        value = self.read().get(fingerprint)
+        if value is None:
+            return None
+        return Checkpoint(fingerprint,*value)
+
+    def save(self,checkpoint):
+        data = self.read()
+        data[checkpoint.fingerprint] = [checkpoint.line,checkpoint.batch]
+        self.write(data)
+
+    def clear(self,fingerprint):
+        data = self.read()
+        if data.pop(fingerprint,None) is not None:
+            self.write(data)
+
+class ModelCheckpointStore(BaseCheckpointStore):
+    """
+    Keep checkpoints in data_importer.models.ImportCheckpoint table, or in
+    other model with same fields. Checkpoints saved inside a batch
+    transaction are committed or rolled back with the batch.
+    """
+    transactional = True
+
+    def __init__(self,model=None,using=None):
+        if model is None:
+            from data_importer.models import ImportCheckpoint as model
+        self.model = model
+        self.using = using
+
+    def get_queryset(self):
+        return self.model._default_manager.db_manager(self.using).all()
+
+    def load(self,fingerprint):
+        try:
+            obj = self.get_queryset().get(fingerprint=fingerprint)
+        except self.model.DoesNotExist:
+            return None
+        return Checkpoint(fingerprint,obj.line,obj.batch)
+
+    def save(self,checkpoint):
+        qs = self.get_queryset()
+        if not qs.filter(fingerprint=checkpoint.fingerprint).update(line=checkpoint.line,batch=checkpoint.batch):
+            qs.create(fingerprint=checkpoint.fingerprint,line=checkpoint.line,batch=checkpoint.batch)
+
+    def clear(self,fingerprint):
+        self.get_queryset().filter(fingerprint=fingerprint).delete()
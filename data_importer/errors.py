@@ -0,0 +1,65 @@
+# coding: utf-8
+from array import array
+from bisect import bisect_left
+from django.utils.datastructures import SortedDict
+
+class ErrorStore(SortedDict):
+    """
+    Errors of an import, as a SortedDict {line: {field: [messages]}}.
+
+    Only details of the first max_lines failed lines are kept (all of them
+    if max_lines is None), but number of all failed lines are kept in a
+    compact array and counts of each (field, message) are kept for all
+    lines. Messages are interned, so a message repeated in many lines is
+    stored only once.
+    """
+
+    def __init__(self,max_lines=None):
+        super(ErrorStore,self).__init__()
+        self.max_lines = max_lines
+        self.lines = array('l') # all failed lines, in order
+        self.counts = {} # {(field, message): count}
+        self._messages = {}
+
+    def intern(self,msg):
+        return self._messages.setdefault(msg,msg)
+
+    def add(self,i,line_errors):
+        """
+        Register errors of line i. line_errors is a dict {field: [messages]}.
+        Return line errors with interned messages.
+        """
+        interned = SortedDict()
+        counts = self.counts
+        for field,messages in line_errors.items():
+            messages = [self.intern(msg) for msg in messages]
+            for msg in messages:
+                counts[(field,msg)] = counts.get((field,msg),0) + 1
+            interned[field] = messages
+        self.lines.append(i)
+        if self.max_lines is None or len(self) < self.max_lines:
+            self[i] = interned
+        return interned
+
+    def has_line(self,i):
+        """
+        Return True if line i failed, even if its details wasn't kept.
+        """
+        pos = bisect_left(self.lines,i)
+        return pos < len(self.lines) and self.lines[pos] == i
+
+    def failed_lines(self):
+        return iter(self.lines)
+
+    def summary(self):
+        """
+        List of (field, message, count), most frequent errors first.
+        """
+        return sorted([(field,msg,count) for (field,msg),count in self.counts.items()],
+            key=lambda item: -item[2])
+
+    def __nonzero__(self):
+        return len(self.lines) > 0
+
+    def copy(self):
+        return SortedDict(self)
@@ -7,3 +7,17 @@ class UnknowSource(Exception):
         if err:
             self.msg = _(u"%(msg)s, the error was: %(err)s") % {'msg':self.msg,'err':err}
 
+
+class CoercionError(ValueError):
+    """
+    Raised by readers in strict mode when a value doesn't match the type
+    planned for its column.
+    """
+    def __init__(self,line,column,value,type_name):
+        self.line = line
+        self.column = column
+        self.value = value
+        self.type_name = type_name
+        self.msg = _(u"Line %(line)s, column %(column)s: %(value)r isn't a valid %(type)s value.") % {
+            'line':line,'column':column,'value':value,'type':type_name}
+        super(CoercionError,self).__init__(self.msg)
@@ -1,7 +1,30 @@
 # coding: utf-8
 
+import atexit
 import logging
+import threading
+import traceback
 from logging import StreamHandler
+from Queue import Full
+from django.db import connections, router
+
+# what QueueHandler does when queue is full: wait for room, drop records
+# below WARNING or keep one in sample records below WARNING
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP = 'drop'
+OVERFLOW_SAMPLE = 'sample'
+
+def prepare_record(record):
+    """
+    Merge args in message and drop traceback, so record can be handled
+    later, in other thread or process.
+    """
+    record.msg = record.getMessage()
+    record.args = None
+    if record.exc_info:
+        record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+    return record
 
 # define a null logging handler, like in py 2.7 docs: 
 # http://docs.python.org/library/logging.handlers.html#nullhandler
@@ -16,6 +39,21 @@ class NullHandler(logging.Handler):
     def createLock(self):
         return None
 
+# keep prepared records in a list, used to send log records of worker
+# processes to be handled by importer logger in parent process.
+class RecordListHandler(logging.Handler):
+    def __init__(self,*args,**kwargs):
+        logging.Handler.__init__(self,*args,**kwargs)
+        self.records = []
+
+    def emit(self,record):
+        # record should be pickled
+        self.records.append(prepare_record(record))
+
+    def pop(self):
+        records,self.records = self.records,[]
+        return records
+
 # define a generic database logger handler.
 class DBLoggingHandler(logging.Handler):
     # based on https://github.com/dcramer/django-db-log/blob/master/djangodblog/handlers.py
@@ -28,3 +66,205 @@ class DBLoggingHandler(logging.Handler):
         return self.model.objects.create_from_record(record)
         
 
+# buffered handlers with records not written yet, flushed at exit
+_pending_handlers = set()
+
+def _flush_pending():
+    for handler in list(_pending_handlers):
+        handler.flush()
+
+atexit.register(_flush_pending)
+
+# write records to database in bulk, from a background thread.
+class BufferedDBLoggingHandler(DBLoggingHandler):
+    """
+    Keep records in a buffer and save them with one bulk_create when
+    capacity records are buffered or each flush_interval seconds, from a
+    background thread. Model manager should have build_from_record(record),
+    that return a not saved instance.
+
+    flush() writes buffered records in calling thread, importers call it at
+    end of save_all. Records not written are flushed at interpreter exit.
+    Background thread use its own database connection, and records are
+    committed apart from import transactions. close() stops the thread,
+    importers close handlers of the previous importer of their class.
+    """
+    def __init__(self,*args,**kwargs):
+        self.capacity = kwargs.pop('capacity',500)
+        self.flush_interval = kwargs.pop('flush_interval',5.0)
+        self.using = kwargs.pop('using',None)
+        DBLoggingHandler.__init__(self,*args,**kwargs)
+        assert hasattr(self.model.objects,'build_from_record') is True
+        self.buffer = []
+        # not the handler lock, logging.shutdown holds it while closing
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def emit(self,record):
+        # format message now, args can change before record is written
+        record = prepare_record(record)
+        with self._buffer_lock:
+            self.buffer.append(record)
+            _pending_handlers.add(self)
+        if self._thread is None:
+            self.start()
+        if len(self.buffer) >= self.capacity:
+            self._wakeup.set()
+
+    def start(self):
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run,name='BufferedDBLoggingHandler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stopping:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                try:
+                    self.flush()
+                except Exception:
+                    # records are back in buffer, retried in next flush
+                    traceback.print_exc()
+        finally:
+            connections[self.using or router.db_for_write(self.model)].close()
+
+    def flush(self):
+        """
+        Write buffered records. If writing fails records are kept in buffer,
+        so they are written by a later flush.
+        """
+        with self._flush_lock:
+            with self._buffer_lock:
+                records,self.buffer = self.buffer,[]
+                _pending_handlers.discard(self)
+            if not records:
+                return
+            try:
+                self.model.objects.db_manager(self.using).bulk_create(
+                    [self.model.objects.build_from_record(record) for record in records])
+            except Exception:
+                with self._buffer_lock:
+                    self.buffer[:0] = records
+                    _pending_handlers.add(self)
+                raise
+
+    def stop(self):
+        """
+        Stop background thread, that closes its database connection.
+        """
+        if self._thread is not None:
+            self._stopping = True
+            self._wakeup.set()
+            if self._thread is not threading.current_thread():
+                self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        self.flush()
+        DBLoggingHandler.close(self)
+
+# put records in a bounded queue, handled by a QueueListener thread. Like
+# logging.handlers.QueueHandler of Python 3.2, with a overflow policy.
+class QueueHandler(logging.Handler):
+    def __init__(self,queue,overflow=OVERFLOW_BLOCK,sample=10,listener=None):
+        logging.Handler.__init__(self)
+        self.queue = queue
+        self.overflow = overflow
+        self.sample = sample
+        self.listener = listener
+        self.dropped = 0
+        self._skipped = 0
+
+    def emit(self,record):
+        try:
+            self.queue.put_nowait(prepare_record(record))
+            return
+        except Full:
+            pass
+        if self.overflow != OVERFLOW_BLOCK and record.levelno < logging.WARNING:
+            if self.overflow == OVERFLOW_DROP or self._skipped < self.sample - 1:
+                self._skipped += 1
+                self.dropped += 1
+                return
+            self._skipped = 0
+        self.queue.put(record)
+
+    def flush(self):
+        """
+        Wait listener handle all queued records.
+        """
+        if self.dropped:
+            record = logging.LogRecord('data_importer',logging.WARNING,__file__,0,
+                u"%s log records dropped because log queue was full.",(self.dropped,),None)
+            self.dropped = 0
+            self.queue.put(prepare_record(record))
+        if self.listener is not None:
+            self.listener.flush()
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+        logging.Handler.close(self)
+
+class QueueListener(object):
+    """
+    Thread that handle records of queue with handlers, so slow handlers
+    don't block the thread that log. stop() closes handlers, unless
+    close_handlers is False (handlers shared with other loggers).
+    """
+    _sentinel = None
+
+    def __init__(self,queue,*handlers,**kwargs):
+        self.queue = queue
+        self.handlers = handlers
+        self.close_handlers = kwargs.pop('close_handlers',True)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._monitor,name='QueueListener')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def handle(self,record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _monitor(self):
+        while True:
+            record = self.queue.get()
+            try:
+                if record is self._sentinel:
+                    return
+                self.handle(record)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """
+        Wait all queued records be handled and flush handlers.
+        """
+        if self._thread is not None:
+            self.queue.join()
+        for handler in self.handlers:
+            handler.flush()
+
+    def stop(self):
+        if self._thread is not None:
+            self.queue.put(self._sentinel)
+            self._thread.join()
+            self._thread = None
+        for handler in self.handlers:
+            if self.close_handlers:
+                # stop threads and files of handlers, like BufferedDBLoggingHandler
+                handler.close()
+            else:
+                handler.flush()
@@ -0,0 +1,99 @@
+# coding: utf-8
+from django.core.exceptions import ValidationError
+from django.utils.translation import ugettext as _
+from data_importer.utils import LRUCache
+
+# from django.core.validators.EMPTY_VALUES
+EMPTY_VALUES = (None, '', [], (), {})
+
+# marks values that doesn't exist in database
+_MISSING = object()
+
+class Lookup(object):
+    """
+    Declare that values of a importer field are keys of model instances:
+
+        class Importer(BaseImporter):
+            fields = ['cliente', ...]
+            lookups = {'cliente': Lookup(Customer, 'code')}
+
+    Values of a chunk of lines are resolved with one filter(code__in=...)
+    query (or one for each query_size values) and the cleaned value is the
+    instance. Found and missing keys are kept in a LRU cache of cache_size
+    keys, so repeated keys don't hit the database again. Missing keys are
+    validation errors of the line.
+    """
+    query_size = 500 # sqlite doesn't accept more than 999 query parameters
+
+    def __init__(self,model,field='pk',cache_size=10000,queryset=None):
+        self.model = model
+        self.field = field
+        self.cache_size = cache_size
+        self.queryset = queryset
+
+    def get_queryset(self):
+        if self.queryset is not None:
+            return self.queryset._clone()
+        return self.model._default_manager.all()
+
+    def get_model_field(self):
+        if self.field == 'pk':
+            return self.model._meta.pk
+        return self.model._meta.get_field(self.field)
+
+    def get_cache(self):
+        return LRUCache(self.cache_size)
+
+    def resolve(self,keys,cache):
+        """
+        Return a dict {key: instance or _MISSING} for all keys, querying
+        only keys that aren't in cache. Keys should be already converted
+        with to_python of model field.
+        """
+        found = {}
+        missing = []
+        for key in set(keys):
+            if key in cache:
+                found[key] = cache[key]
+            else:
+                missing.append(key)
+
+        to_python = self.get_model_field().to_python
+        for start in range(0,len(missing),self.query_size):
+            chunk = missing[start:start + self.query_size]
+            lookup = {'%s__in' % self.field: chunk}
+            for obj in self.get_queryset().filter(**lookup):
+                key = to_python(getattr(obj,self.field))
+                found[key] = cache[key] = obj
+            for key in chunk:
+                if key not in found:
+                    found[key] = cache[key] = _MISSING
+        return found
+
+    def clean(self,values,lines,cache):
+        """
+        Batch cleaner for lookup fields, see BaseImporter.batch_plan.
+        """
+        to_python = self.get_model_field().to_python
+        keys = []
+        for value in values:
+            if value in EMPTY_VALUES:
+                keys.append(value)
+                continue
+            try:
+                keys.append(to_python(value))
+            except ValidationError, err:
+                keys.append(err)
+
+        found = self.resolve([k for k in keys if k not in EMPTY_VALUES and not isinstance(k,ValidationError)],cache)
+        cleaned = []
+        for value,key in zip(values,keys):
+            if key in EMPTY_VALUES or isinstance(key,ValidationError):
+                cleaned.append(key)
+                continue
+            obj = found[key]
+            if obj is _MISSING:
+                obj = ValidationError(_(u"%(model)s with %(field)s %(value)s doesn't exist.") % {
+                    'model':self.model._meta.verbose_name,'field':self.field,'value':value})
+            cleaned.append(obj)
+        return cleaned
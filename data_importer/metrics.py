@@ -0,0 +1,168 @@
+# coding: utf-8
+import logging
+import threading
+import time
+
+COUNTERS = ('valid','invalid','empty','saved')
+LOGGER_METHODS = ('debug','info','warning','warn','error','exception','critical','log','handle')
+
+class Metrics(object):
+    """
+    Time spent in each stage of an import and counters of lines.
+
+    Stages are 'read' (reader iteration, with get_item), 'get_item',
+    'clean_<field>', 'clean_<field>_batch', 'save' and 'logging'. Time of
+    a stage is wall time of its calls, so with threads it can be greater
+    than elapsed time. Stages and counters can be updated from threads.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.rows = 0 # lines read from file
+        self.stages = {} # {stage: [seconds, calls]}
+        self.counters = dict.fromkeys(COUNTERS,0)
+        self._lock = threading.Lock()
+
+    def add(self,stage,seconds,calls=1):
+        with self._lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = [0.0,0]
+            entry[0] += seconds
+            entry[1] += calls
+
+    def incr(self,counter,n=1):
+        with self._lock:
+            self.counters[counter] += n
+
+    def reset_counters(self,names):
+        with self._lock:
+            for name in names:
+                self.counters[name] = 0
+
+    def iter_rows(self,rows,callback=None,interval=None):
+        """
+        Yield items of rows timing the reader and counting lines. Call
+        callback at most once each interval seconds.
+        """
+        rows = iter(rows)
+        last = time.time()
+        while True:
+            start = time.time()
+            try:
+                item = rows.next()
+            except StopIteration:
+                self.add('read',time.time() - start,0)
+                return
+            now = time.time()
+            self.add('read',now - start)
+            self.rows += 1
+            if callback is not None and now - last >= interval:
+                last = now
+                callback()
+            yield item
+
+    def summary(self):
+        """
+        Return a dict with elapsed seconds, lines read, lines per second,
+        counters and {stage: {'seconds','calls'}}. 'parse' is time of
+        reader without get_item.
+        """
+        elapsed = time.time() - self.started
+        with self._lock:
+            stages = dict([(stage,{'seconds':seconds,'calls':calls})
+                for stage,(seconds,calls) in self.stages.items()])
+            counters = dict(self.counters)
+        if 'read' in stages:
+            item = stages.get('get_item',{'seconds':0.0})
+            stages['parse'] = {'seconds':stages['read']['seconds'] - item['seconds'],'calls':stages['read']['calls']}
+        return {
+            'elapsed':elapsed,
+            'rows':self.rows,
+            'rows_per_second':self.rows / elapsed if elapsed else 0.0,
+            'counters':counters,
+            'stages':stages,
+        }
+
+class Timed(object):
+    """
+    Callable that add time of each call of func to stage.
+    """
+
+    def __init__(self,metrics,stage,func):
+        self.metrics = metrics
+        self.stage = stage
+        self.func = func
+
+    def __call__(self,*args,**kwargs):
+        start = time.time()
+        try:
+            return self.func(*args,**kwargs)
+        finally:
+            self.metrics.add(self.stage,time.time() - start)
+
+class TimedLogger(object):
+    """
+    Proxy of a logger that add time of logging calls to 'logging' stage.
+    Logger is shared by all importers of a class, so it isn't changed.
+    """
+
+    def __init__(self,logger,metrics):
+        self.__dict__['_logger'] = logger
+        for name in LOGGER_METHODS:
+            self.__dict__[name] = Timed(metrics,'logging',getattr(logger,name))
+
+    def __getattr__(self,name):
+        return getattr(self._logger,name)
+
+    def __setattr__(self,name,value):
+        setattr(self._logger,name,value)
+
+class LineSummary(object):
+    """
+    Count valid, invalid, empty and saved lines and log one message for each
+    size lines, instead of one message for each line.
+
+    While saving, lines are validated ahead of saves (batches of
+    ModelImporter, save_threads), so a window is logged only when done is
+    called with a line after it.
+    """
+
+    def __init__(self,logger,size,template):
+        self.logger = logger
+        self.size = size
+        self.template = template
+        self.saving = False
+        self.windows = {} # {window: [first, last, counts]}
+
+    def add(self,i,counter):
+        window = (i - 1) // self.size
+        if not self.saving:
+            self.flush(window)
+        entry = self.windows.get(window)
+        if entry is None:
+            entry = self.windows[window] = [i,i,dict.fromkeys(COUNTERS,0)]
+        elif i < entry[0]:
+            entry[0] = i
+        elif i > entry[1]:
+            entry[1] = i
+        entry[2][counter] += 1
+
+    def done(self,i):
+        """
+        Lines until i were saved, log windows before the one of i.
+        """
+        self.flush((i - 1) // self.size)
+
+    def flush(self,before=None):
+        """
+        Log windows before window before, or all windows.
+        """
+        for window in sorted(self.windows):
+            if before is not None and window >= before:
+                break
+            first,last,counts = self.windows.pop(window)
+            if self.logger.isEnabledFor(logging.INFO):
+                args = dict(counts)
+                args.update({'first':first,'last':last})
+                self.logger.info(self.template,args)
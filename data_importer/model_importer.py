@@ -0,0 +1,302 @@
+# coding: utf-8
+from array import array
+from collections import namedtuple
+from django.db import connections, router, transaction, DatabaseError
+from django.db.models import AutoField
+from django.db.models import Q
+from django.utils.translation import ugettext as _
+from data_importer.base import BaseImporter
+
+# outcome of each batch saved by ModelImporter
+BatchResult = namedtuple('BatchResult','number lines saved error')
+
+def atomic(using=None):
+    """
+    One transaction for a block: transaction.atomic in Django >= 1.6 and
+    commit_on_success before it.
+    """
+    if hasattr(transaction,'atomic'):
+        return transaction.atomic(using=using)
+    return transaction.commit_on_success(using=using)
+
+class ModelImporter(BaseImporter):
+    """
+    Importer that save valid lines to self.model. Lines are buffered and
+    saved with bulk_create in batches of batch_size lines, each batch in
+    one transaction.
+
+    save_all and save_all_iter return a BatchResult for each batch. If a
+    batch fails its transaction is rolled back, the error is logged and
+    the import continues with next batch.
+
+    With upsert = True lines whose natural_key already exists in database
+    update the existing row instead of insert a new one. Existing keys are
+    fetched with one query per batch, new lines are saved with bulk_create
+    and existing ones with one UPDATE ... CASE query per query_size
+    parameters. With update_changed_only lines equal to database are
+    skipped and only changed fields are written. Keys should be unique in
+    file, see BaseImporter.unique_together.
+
+    With staging = True the import is all or nothing: nothing is saved if
+    any line is invalid. Valid lines are loaded in a temporary table and
+    applied to model table with set based statements (one INSERT ... SELECT,
+    or one UPDATE and one INSERT with upsert), all in one transaction, and
+    save_all returns only one BatchResult. It works with SQLite and
+    PostgreSQL, MySQL can't use a temporary table twice in a statement.
+
+    Requires Django >= 1.4 (bulk_create).
+    """
+    model = None
+    batch_size = 500
+    using = None # database alias, None use router
+    upsert = False
+    natural_key = () # model fields that identify a row, like ('code',)
+    update_changed_only = False
+    query_size = 500 # sqlite doesn't accept more than 999 query parameters
+    staging = False
+
+    def __init__(self,*args,**kwargs):
+        if self.staging:
+            # lines are read twice, to validate and to load them, also when
+            # is_valid() was called before save_all
+            self.spool_validated_rows = True
+        super(ModelImporter,self).__init__(*args,**kwargs)
+
+    def _validate_class(self):
+        assert self.model is not None,_(u"You should set attribute model in class!")
+        assert not self.upsert or self.natural_key,_(u"You should set attribute natural_key to use upsert!")
+        return super(ModelImporter,self)._validate_class()
+
+    def get_model_fields(self):
+        """
+        Importer fields that are model fields too.
+        """
+        names = set([f.name for f in self.model._meta.fields])
+        return [field for field in self.fields if field in names]
+
+    def get_instance(self,i,row):
+        """
+        Return a not saved model instance for a valid line. Customize it if
+        fields of file and model don't match.
+        """
+        return self.model(**dict([(field,row[field]) for field in self._model_fields]))
+
+    def get_manager(self):
+        # reads of upsert use database of writes, inside batch transaction
+        return self.model._default_manager.db_manager(self.get_connection().alias)
+
+    def count_saved(self,result):
+        return result.saved
+
+    def get_connection(self):
+        return connections[self.using or router.db_for_write(self.model)]
+
+    def _iter_saved(self):
+        self._model_fields = self.get_model_fields()
+        # batches numbers continue after a resumed checkpoint
+        self._batch_number = self._checkpoint and self._checkpoint.batch or 0
+        if self.staging:
+            yield self._save_staged()
+            return
+
+        batch = []
+        for i,row in self._iter_clean_all():
+            if row:
+                batch.append((i,self.get_instance(i,row)))
+                if len(batch) >= self.batch_size:
+                    yield self._save_batch(batch)
+                    batch = []
+        if batch:
+            yield self._save_batch(batch)
+
+    def _save_batch(self,batch):
+        self._batch_number += 1
+        number = self._batch_number
+        lines = [i for i,obj in batch]
+        # a checkpoint outside database is written only after commit, so it
+        # never points past lines that were rolled back
+        transactional = self._checkpoint_store is not None and self._checkpoint_store.transactional
+        try:
+            # database of writes, chosen by router when using is None
+            with atomic(using=self.get_connection().alias):
+                saved = self.save_batch([obj for i,obj in batch])
+                if transactional:
+                    self.checkpoint(lines[-1],number)
+        except DatabaseError, err:
+            self.logger.error(_(u"Batch %(batch)s, lines %(first)s to %(last)s: %(err)s") % {
+                'batch':number,'first':lines[0],'last':lines[-1],'err':err})
+            if self._summary is not None:
+                self._summary.done(lines[-1])
+            return BatchResult(number,lines,0,err)
+        if not transactional:
+            self.checkpoint(lines[-1],number)
+        if self._summary is not None:
+            for i in lines:
+                self._summary.add(i,'saved')
+            self._summary.done(lines[-1])
+        self.logger.info(_(u"Batch %(batch)s, lines %(first)s to %(last)s saved successfully"),{
+            'batch':number,'first':lines[0],'last':lines[-1]})
+        return BatchResult(number,lines,saved,None)
+
+    def _save_staged(self):
+        """
+        Validate all lines and load valid ones through a staging table.
+        """
+        self._batch_number += 1
+        lines = array('l')
+        if not self.is_valid():
+            msg = _(u"File have %(count)s invalid lines, nothing was saved.") % {'count':len(self.errors.lines)}
+            self.logger.error(msg)
+            return BatchResult(self._batch_number,lines,0,msg)
+
+        connection = self.get_connection()
+        qn = connection.ops.quote_name
+        fields = [f for f in self.model._meta.local_fields if not isinstance(f,AutoField)]
+        target = qn(self.model._meta.db_table)
+        stage = qn('%s_staging' % self.model._meta.db_table)
+        columns = ', '.join([qn(f.column) for f in fields])
+        cursor = connection.cursor()
+        try:
+            # staging table is dropped in the transaction, a rollback drops it too
+            with atomic(using=connection.alias):
+                cursor.execute('CREATE TEMPORARY TABLE %s AS SELECT %s FROM %s WHERE 1 = 0' % (stage,columns,target))
+                insert = 'INSERT INTO %s (%s) VALUES (%s)' % (stage,columns,', '.join(['%s'] * len(fields)))
+                batch = []
+                for i,row in self._iter_clean_all():
+                    if not row:
+                        continue
+                    obj = self.get_instance(i,row)
+                    batch.append([f.get_db_prep_save(f.pre_save(obj,True),connection=connection) for f in fields])
+                    lines.append(i)
+                    if len(batch) >= self.batch_size:
+                        cursor.executemany(insert,batch)
+                        batch = []
+                if batch:
+                    cursor.executemany(insert,batch)
+                self.merge_staged(cursor,stage,target,fields)
+                cursor.execute('DROP TABLE %s' % stage)
+        except DatabaseError, err:
+            self.logger.error(_(u"Import failed and was rolled back: %(err)s") % {'err':err})
+            if connection.vendor == 'sqlite':
+                # python sqlite3 commits before DDL, so rollback kept the table
+                cursor.execute('DROP TABLE IF EXISTS temp.%s' % stage)
+            return BatchResult(self._batch_number,lines,0,err)
+
+        self.logger.info(_(u"%(count)s lines saved successfully") % {'count':len(lines)})
+        return BatchResult(self._batch_number,lines,len(lines),None)
+
+    def merge_staged(self,cursor,stage,target,fields):
+        """
+        Apply lines of staging table to model table.
+        """
+        qn = self.get_connection().ops.quote_name
+        columns = ', '.join([qn(f.column) for f in fields])
+        if not self.upsert:
+            cursor.execute('INSERT INTO %s (%s) SELECT %s FROM %s' % (target,columns,columns,stage))
+            return
+
+        keys = [self.model._meta.get_field(name).column for name in self.natural_key]
+        def match(alias,other):
+            return ' AND '.join(['%s.%s = %s.%s' % (alias,qn(c),other,qn(c)) for c in keys])
+
+        others = [f for f in fields if f.column not in keys]
+        if others:
+            cursor.execute('UPDATE %s SET %s WHERE EXISTS (SELECT 1 FROM %s s WHERE %s)' % (
+                target,
+                ', '.join(['%s = (SELECT s.%s FROM %s s WHERE %s)' % (qn(f.column),qn(f.column),stage,match('s',target))
+                    for f in others]),
+                stage,match('s',target)))
+        cursor.execute('INSERT INTO %s (%s) SELECT %s FROM %s s WHERE NOT EXISTS (SELECT 1 FROM %s t WHERE %s)' % (
+            target,columns,', '.join(['s.%s' % qn(f.column) for f in fields]),stage,target,match('t','s')))
+
+    def save_batch(self,objs):
+        """
+        Save a list of instances, runs inside a transaction. Return number
+        of saved lines.
+        """
+        if self.upsert:
+            return self.upsert_batch(objs)
+        self.get_manager().bulk_create(objs)
+        return len(objs)
+
+    def get_key(self,obj):
+        return tuple([f.to_python(getattr(obj,f.attname)) for f in self._key_fields])
+
+    def get_existing(self,objs):
+        """
+        Return {natural key: instance} of objs already in database.
+        """
+        keys = list(set([self.get_key(obj) for obj in objs]))
+        names = [f.name for f in self._key_fields]
+        existing = {}
+        step = max(1,self.query_size // len(names))
+        for start in range(0,len(keys),step):
+            chunk = keys[start:start + step]
+            if len(names) == 1:
+                qs = self.get_manager().filter(**{'%s__in' % names[0]: [k[0] for k in chunk]})
+            else:
+                q = Q()
+                for key in chunk:
+                    q |= Q(**dict(zip(names,key)))
+                qs = self.get_manager().filter(q)
+            for obj in qs:
+                existing[self.get_key(obj)] = obj
+        return existing
+
+    def upsert_batch(self,objs):
+        self._key_fields = [self.model._meta.get_field(name) for name in self.natural_key]
+        key_names = set(self.natural_key)
+        fields = [self.model._meta.get_field(name) for name in self._model_fields if name not in key_names]
+        existing = self.get_existing(objs)
+
+        inserts,updates = [],[]
+        for obj in objs:
+            current = existing.get(self.get_key(obj))
+            if current is None:
+                inserts.append(obj)
+                continue
+            obj.pk = current.pk
+            if self.update_changed_only:
+                changed = [f for f in fields
+                    if f.to_python(getattr(obj,f.attname)) != f.to_python(getattr(current,f.attname))]
+            else:
+                changed = fields
+            # rows with only key fields have nothing to update
+            if changed:
+                updates.append((obj,changed))
+
+        if inserts:
+            self.get_manager().bulk_create(inserts)
+        if updates:
+            self.update_rows(updates)
+        return len(inserts) + len(updates)
+
+    def update_rows(self,updates):
+        """
+        Write a list of (instance, changed fields) with one UPDATE ... SET
+        column = CASE pk WHEN ... END for each query_size parameters.
+        """
+        connection = self.get_connection()
+        qn = connection.ops.quote_name
+        pk = qn(self.model._meta.pk.column)
+        fields = []
+        for obj,changed in updates:
+            fields.extend([f for f in changed if f not in fields])
+        step = max(1,self.query_size // (len(fields) * 2 + 1))
+        cursor = connection.cursor()
+        for start in range(0,len(updates),step):
+            chunk = updates[start:start + step]
+            sets,params = [],[]
+            for field in fields:
+                whens = []
+                for obj,changed in chunk:
+                    if field in changed:
+                        whens.append('WHEN %s THEN %s')
+                        params.append(obj.pk)
+                        params.append(field.get_db_prep_save(getattr(obj,field.attname),connection=connection))
+                if whens:
+                    column = qn(field.column)
+                    sets.append('%s = CASE %s %s ELSE %s END' % (column,pk,' '.join(whens),column))
+            params.extend([obj.pk for obj,changed in chunk])
+            cursor.execute('UPDATE %s SET %s WHERE %s IN (%s)' % (qn(self.model._meta.db_table),', '.join(sets),pk,
+                ', '.join(['%s'] * len(chunk))),params)
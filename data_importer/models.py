@@ -0,0 +1,14 @@
+# coding: utf-8
+from django.db import models
+
+class ImportCheckpoint(models.Model):
+    """
+    Last line saved of a file, used by checkpoints.ModelCheckpointStore.
+    """
+    fingerprint = models.CharField(max_length=32,unique=True)
+    line = models.IntegerField()
+    batch = models.IntegerField(null=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return u"%s :: line %s" % (self.fingerprint,self.line)
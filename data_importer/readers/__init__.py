@@ -1,5 +1,6 @@
 # coding: utf-8
 
 from .base import BaseReader
+from .row import Row
 from .csv_reader import CSVReader
 from .xls_reader import XLSReader, XLSXReader
@@ -3,7 +3,9 @@ from django.utils.datastructures import SortedDict
 from django.utils.encoding import smart_unicode
 from data_importer.exceptions import UnknowSource
 import unicodedata
+from itertools import chain, islice
 from data_importer.utils import to_unicode
+from .row import Row
 
 class BaseReader(object):
 
@@ -15,10 +17,29 @@ class BaseReader(object):
         self._source = None
         self._reader = None
         self._headers = None
+        self._columns = None
+        self._fields = None
+        self._skip = 0
         self.__load(f)
 
     def __iter__(self):
-        return self.get_items()
+        if not self._skip:
+            return self.get_items()
+        return self._iter_skipped()
+
+    def _iter_skipped(self):
+        """
+        Skip lines for readers whose get_items doesn't call pop_skip, they
+        are converted to rows and dropped.
+        """
+        items = self.get_items()
+        try:
+            first = items.next()
+        except StopIteration:
+            return
+        # readers that support skip called pop_skip before first item
+        for item in islice(chain([first],items),self.pop_skip(),None):
+            yield item
 
     def __load(self, source):
         """
@@ -72,10 +93,12 @@ class BaseReader(object):
 
     def get_item(self,row):
         """
-        Given a header and a row return a sorted dict
+        Given a header and a row return a Row, a dict like object
         """
         def normalize(s):
-            if isinstance(s,basestring):
+            if isinstance(s,unicode):
+                return s.strip()
+            if isinstance(s,str):
                 try:
                     return to_unicode(s.strip())
                 except (UnicodeDecodeError,UnicodeEncodeError):
@@ -83,18 +106,39 @@ class BaseReader(object):
             else:
                 return s
 
-        # if we have headers = ['a','b'] and values [1,2,3,4], dict will be
-        # {'a':1,'b':2}
-        # if we have headers = ['a','b','c','d'] and values [1,2], dict will be
+        if self._columns is None:
+            self.set_columns()
+
+        # if we have headers = ['a','b'] and values [1,2,3,4], row will be
         # {'a':1,'b':2}
-        d = SortedDict([i for i in zip(self.headers,map(normalize,row)) if i[0]])
-        # since zip can cut tuple to smaller sequence, if we get incomplete
-        # lines in file this for over headers put it on row dict
-        for k in self.headers:
-            if k not in d:
-                d[k]=u''
-        d.keyOrder = self.headers
-        return d
+        # if we have headers = ['a','b','c','d'] and values [1,2], row will be
+        # {'a':1,'b':2,'c':u'','d':u''}
+        size = len(row)
+        return Row(self._keys,self._index,tuple([normalize(row[c]) if c < size else u'' for c in self._columns]))
+
+    def set_fields(self,fields):
+        """
+        Read only columns whose header is in fields, other columns aren't
+        converted, normalized nor returned in rows. Should be called before
+        iterate the reader.
+        """
+        self._fields = set(fields)
+        self._columns = None
+
+    def set_columns(self):
+        """
+        Build the header -> position map shared by all rows of the file.
+        Columns without header or out of fields given to set_fields are
+        ignored and if a header is repeated the last column wins.
+        """
+        positions = SortedDict()
+        fields = self._fields
+        for c,header in enumerate(self.headers):
+            if header and (fields is None or header in fields):
+                positions[header] = c
+        self._keys = tuple(positions.keys())
+        self._index = dict((k,i) for i,k in enumerate(self._keys))
+        self._columns = positions.values()
 
     @property
     def headers(self):
@@ -125,6 +169,18 @@ class BaseReader(object):
         value = value.replace(u' ',u'_')
         return value
 
+    def skip(self,n):
+        """
+        Next iteration starts at line n + 1. Readers that call pop_skip in
+        get_items read skipped lines but don't convert them to rows, so it's
+        cheap to resume a big file; for other readers rows are dropped.
+        """
+        self._skip = n
+
+    def pop_skip(self):
+        n,self._skip = self._skip,0
+        return n
+
     def get_items(self):
         """
         Iterator do read the rows of file. Should return a dict with fields
@@ -0,0 +1,71 @@
+# coding: utf-8
+"""
+Converters used by readers to coerce raw string values, like CSV ones, to
+python types. Each converter receive a non empty string and return converted
+value or raise ValueError if value doesn't match the type.
+"""
+import re
+import datetime
+from decimal import Decimal, InvalidOperation
+
+INT_RE = re.compile(r'^\s*[-+]?\d+\s*$')
+DECIMAL_RE = re.compile(r'^\s*[-+]?(\d+\.?\d*|\.\d+)\s*$')
+
+DATE_FORMATS = ('%Y-%m-%d','%d/%m/%Y')
+
+def to_auto(value):
+    """
+    Old CSVReader behaviour: integers are returned as int, everything else
+    as is. Uses a regex instead of int() inside try/except, so text values
+    don't raise and catch an exception.
+    """
+    if INT_RE.match(value):
+        return int(value)
+    return value
+
+def to_int(value):
+    return int(value)
+
+def to_decimal(value):
+    try:
+        return Decimal(value.strip())
+    except InvalidOperation:
+        raise ValueError(value)
+
+def to_date(value,formats=DATE_FORMATS):
+    value = value.strip()
+    for fmt in formats:
+        try:
+            return datetime.datetime.strptime(value,fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(value)
+
+# text columns are passed untouched, so they don't have a converter
+CONVERTERS = {
+    'auto': to_auto,
+    'int': to_int,
+    'decimal': to_decimal,
+    'date': to_date,
+    'text': None,
+    'passthrough': None,
+}
+
+def infer_type(values,date_formats=DATE_FORMATS):
+    """
+    Receive a sample of values of a column and return name of the narrowest
+    type that match all non empty values.
+    """
+    values = [v for v in values if v and v.strip()]
+    if not values:
+        return 'auto'
+    if all(INT_RE.match(v) for v in values):
+        return 'int'
+    if all(DECIMAL_RE.match(v) for v in values):
+        return 'decimal'
+    try:
+        for v in values:
+            to_date(v,date_formats)
+    except ValueError:
+        return 'text'
+    return 'date'
@@ -1,26 +1,160 @@
 # coding: utf-8
+import codecs
 import csv
+from cStringIO import StringIO
+from functools import partial
+from itertools import chain, imap, islice
+from django.utils.translation import ugettext as _
+from data_importer.exceptions import CoercionError
+from data_importer.utils import FALLBACK_ENCODING, detect_encoding, recode_lines
 from .base import BaseReader
+from .coercion import CONVERTERS, DATE_FORMATS, infer_type, to_auto, to_date
 
 class CSVReader(BaseReader):
 
     def __init__(self,f,**kwargs):
         self.delimiter = kwargs.pop('delimiter',';')
+        # {column: type name or callable}, see coercion.CONVERTERS
+        self.types = kwargs.pop('types',{})
+        # number of leading rows used to infer types of not declared columns
+        self.infer_types = kwargs.pop('infer_types',0)
+        self.date_formats = kwargs.pop('date_formats',DATE_FORMATS)
+        # raise CoercionError instead of keep raw value when type mismatch
+        self.strict = kwargs.pop('strict',False)
+        # encoding of file, None detect it from first encoding_sample bytes,
+        # see utils.detect_encoding
+        self.encoding = kwargs.pop('encoding',None)
+        self.encoding_sample = kwargs.pop('encoding_sample',65536)
+        self.encoding_errors = kwargs.pop('encoding_errors','strict')
+        self.column_types = None
+        self._decode_columns = None # None decode all columns, like headers
+        self._fallback = None # encoding of file if a row isn't in guessed one
         super(CSVReader,self).__init__(f)
 
     def set_reader(self):
-        self._reader = csv.reader(self._source,delimiter=self.delimiter)
+        sample = self._source.read(self.encoding_sample)
+        if self.encoding is None:
+            detected = detect_encoding(sample)
+            if detected is None:
+                # ASCII sample doesn't tell encoding of the rest of file
+                self._fallback = FALLBACK_ENCODING
+            self.encoding = detected or 'utf-8'
+        self._reader = imap(self.decode_row,csv.reader(self.get_lines(sample),delimiter=self.delimiter))
 
-    def get_value(self,item,**kwargs):
+    def get_lines(self,sample):
+        """
+        Return lines of file as byte strings that csv module can read. Files
+        in encodings that keep ASCII bytes, like UTF-8 and cp1252, are read
+        as is and only cells are decoded, others are recoded to UTF-8.
+        Sample is the start of file, already read.
+        """
+        name = codecs.lookup(self.encoding).name
+        if name == 'utf-8-sig':
+            if sample.startswith(codecs.BOM_UTF8):
+                sample = sample[len(codecs.BOM_UTF8):]
+            name = 'utf-8'
+        if u'\n;,"'.encode(name) == '\n;,"':
+            self._cell_encoding = name
+            # complete last line of sample
+            return chain(StringIO(sample + self._source.readline()),self._source)
+        self._cell_encoding = 'utf-8'
+        chunks = chain([sample],iter(partial(self._source.read,self.encoding_sample),''))
+        return recode_lines(chunks,name,self.encoding_errors)
+
+    def decode_row(self,row):
+        encoding,errors = self._cell_encoding,self.encoding_errors
+        columns = self._decode_columns
         try:
-            int(item)
-        except:
-            pass
-        else:
-            return int(item)
-        return item
+            if columns is None:
+                return [value.decode(encoding,errors) for value in row]
+            size = len(row)
+            for c in columns:
+                if c < size:
+                    row[c] = row[c].decode(encoding,errors)
+            return row
+        except UnicodeDecodeError:
+            if self._fallback is None:
+                raise
+            return self.switch_to_fallback(row)
+
+    def switch_to_fallback(self,row):
+        """
+        First row that isn't UTF-8 after an ASCII sample: decode it and the
+        rest of file with fallback encoding. Rows read before were ASCII,
+        decoded the same in both.
+        """
+        self.encoding = self._cell_encoding = self._fallback
+        self._fallback = None
+        columns = self._decode_columns
+        if columns is None:
+            columns = range(len(row))
+        size = len(row)
+        for c in columns:
+            if c < size:
+                value = row[c]
+                if isinstance(value,unicode):
+                    # cell decoded before the error, get its bytes back
+                    value = value.encode('utf-8')
+                row[c] = value.decode(self._cell_encoding,self.encoding_errors)
+        return row
+
+    def get_value(self,item,**kwargs):
+        return to_auto(item)
+
+    def get_converter(self,type_name):
+        if callable(type_name):
+            return type_name
+        if type_name not in CONVERTERS:
+            raise ValueError(_(u"Unknow type %(type)r, choices are: %(choices)s.") % {'type':type_name,'choices':', '.join(sorted(CONVERTERS))})
+        if type_name == 'date':
+            return partial(to_date,formats=self.date_formats)
+        return CONVERTERS[type_name]
+
+    def get_plan(self,sample):
+        """
+        Build coercion plan once per file. Return a list of
+        (column index, column name, converter) for columns that need
+        conversion and set self.column_types to {column: type}.
+        """
+        self.column_types = {}
+        plan = []
+        columns = set(self._columns)
+        for c,column in enumerate(self.headers):
+            if c not in columns:
+                continue
+            if column in self.types:
+                type_name = self.types[column]
+            elif self.infer_types:
+                type_name = infer_type([row[c] for row in sample if c < len(row)],self.date_formats)
+            else:
+                type_name = 'auto'
+            self.column_types[column] = type_name
+            converter = self.get_converter(type_name)
+            if converter is not None:
+                plan.append((c,column,converter))
+        return plan
+
+    def coerce(self,i,row,plan):
+        size = len(row)
+        for c,column,converter in plan:
+            if c >= size or not row[c]:
+                continue
+            try:
+                row[c] = converter(row[c])
+            except ValueError:
+                if self.strict:
+                    type_name = self.column_types[column]
+                    raise CoercionError(i,column,row[c],getattr(type_name,'__name__',type_name))
+        return row
 
     def get_items(self):
-        for row in self._reader:
-            if not row: continue # invalid lines are ignored
-            yield self.get_item([self.get_value(i) for i in row])
+        if self._columns is None:
+            self.set_columns()
+        # only columns returned in rows are decoded and converted
+        self._decode_columns = self._columns
+        rows = (row for row in self._reader if row) # invalid lines are ignored
+        sample = list(islice(rows,self.infer_types))
+        plan = self.get_plan(sample)
+        skip = self.pop_skip()
+        for i,row in enumerate(islice(chain(sample,rows),skip,None),skip + 1):
+            yield self.get_item(self.coerce(i,row,plan))
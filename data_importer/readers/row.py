@@ -0,0 +1,156 @@
+# coding: utf-8
+from collections import MutableMapping
+
+# marks a header value removed from row with del
+_DELETED = object()
+
+class Row(object):
+    """
+    Dict like row returned by readers.
+
+    Values are kept in a tuple and the header -> position map is shared by all
+    rows of the same file, so a row costs a small object and a tuple instead
+    of a dict and a list of keys. Keys out of headers (like _i set by
+    BaseImporter) are kept as a tuple of (key, value) pairs.
+
+    Rows are copy on write: copy() share values with the original row and
+    the values tuple is only copied when one of the rows is changed.
+    """
+    __slots__ = ('_keys','_index','_values','_extra')
+
+    def __init__(self,keys,index,values,extra=()):
+        self._keys = keys # headers, in file order
+        self._index = index # {header: position in values}
+        self._values = values # tuple, or list after a write
+        self._extra = extra
+
+    @classmethod
+    def from_dict(cls,d):
+        keys = tuple(d.keys())
+        return cls(keys,dict((k,i) for i,k in enumerate(keys)),tuple(d[k] for k in keys))
+
+    def __getitem__(self,key):
+        try:
+            value = self._values[self._index[key]]
+        except KeyError:
+            for k,v in self._extra:
+                if k == key:
+                    return v
+            raise KeyError(key)
+        if value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self,key,value):
+        pos = self._index.get(key)
+        if pos is None:
+            self._extra = tuple([(k,v) for k,v in self._extra if k != key]) + ((key,value),)
+            return
+        if type(self._values) is tuple:
+            self._values = list(self._values)
+        self._values[pos] = value
+
+    def __delitem__(self,key):
+        if key in self._index:
+            self[key] # raise KeyError if already removed
+            self[key] = _DELETED
+        else:
+            extra = tuple([(k,v) for k,v in self._extra if k != key])
+            if len(extra) == len(self._extra):
+                raise KeyError(key)
+            self._extra = extra
+
+    def __contains__(self,key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    has_key = __contains__
+
+    def get(self,key,default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def iteritems(self):
+        for k,v in zip(self._keys,self._values):
+            if v is not _DELETED:
+                yield k,v
+        for item in self._extra:
+            yield item
+
+    def iterkeys(self):
+        for k,v in self.iteritems():
+            yield k
+
+    def itervalues(self):
+        for k,v in self.iteritems():
+            yield v
+
+    __iter__ = iterkeys
+
+    def items(self):
+        return list(self.iteritems())
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def values(self):
+        return list(self.itervalues())
+
+    @property
+    def keyOrder(self):
+        # compatibility with SortedDict rows returned by old readers
+        return self.keys()
+
+    def __len__(self):
+        return len(self.keys())
+
+    def update(self,*args,**kwargs):
+        for k,v in dict(*args,**kwargs).iteritems():
+            self[k] = v
+
+    def setdefault(self,key,default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self,key,*default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+    def copy(self):
+        if type(self._values) is list:
+            # freeze values so both rows can share it again
+            self._values = tuple(self._values)
+        return Row(self._keys,self._index,self._values,self._extra)
+
+    def __eq__(self,other):
+        if isinstance(other,(Row,dict)):
+            return dict(self.iteritems()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self,other):
+        eq = self.__eq__(other)
+        if eq is NotImplemented:
+            return eq
+        return not eq
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{%s}' % ', '.join(['%r: %r' % item for item in self.iteritems()])
+
+    def __reduce__(self):
+        return (Row,(self._keys,self._index,tuple(self._values),self._extra))
+
+MutableMapping.register(Row)
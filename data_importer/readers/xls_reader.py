@@ -19,10 +19,13 @@ class XLSReader(BaseReader):
     def __init__(self,f,**kwargs):
         self._sheet_name = kwargs.pop('sheet',None)
         self._on_demand = kwargs.pop('on_demand',True)
+        # encoding of old XLS files (BIFF < 8) without codepage record
+        self.encoding = kwargs.pop('encoding',None)
         super(XLSReader,self).__init__(f)
 
     def set_reader(self):
-        self._workbook = xlrd.open_workbook(self._source.name,on_demand=self._on_demand)
+        self._workbook = xlrd.open_workbook(self._source.name,on_demand=self._on_demand,
+            encoding_override=self.encoding)
         if self._sheet_name:
             self._reader = self._workbook.sheet_by_name(self._sheet_name)
         else:
@@ -31,10 +34,16 @@ class XLSReader(BaseReader):
         self.nrows = self._reader.nrows
         self.ncols = self._reader.ncols
 
+        # cell types that need conversion, all other types keep xlrd value
+        self._converters = {
+            XL_CELL_DATE: self.convert_date,
+            XL_CELL_NUMBER: self.convert_number,
+        }
+
     @property
     def headers(self):
         if not self._headers:
-            self._headers = map(self.normalize_string,[self._reader.cell(0,c).value for c in range(self.ncols)])
+            self._headers = map(self.normalize_string,self._reader.row_values(0))
         return self._headers
 
     def get_value(self,item,**kwargs):
@@ -42,43 +51,81 @@ class XLSReader(BaseReader):
         Handle different value types for XLS. Item is a cell object.
         """
 
+        convert = self._converters.get(item.ctype)
+        if convert:
+            return convert(item.value)
+        return item.value
+
+    def convert_date(self,value):
         # Thx to Augusto C Men to point fast solution for XLS/XLSX dates
-        if item.ctype == XL_CELL_DATE:
-            return datetime.datetime(*xlrd.xldate_as_tuple(item.value, self._workbook.datemode))
+        return datetime.datetime(*xlrd.xldate_as_tuple(value, self._workbook.datemode))
 
-        if item.ctype == XL_CELL_NUMBER:
-            if item.value % 1 == 0: # integers
-                return int(item.value)
-            else:
-                return item.value
+    def convert_number(self,value):
+        if value % 1 == 0: # integers
+            return int(value)
+        return value
 
-        return item.value
+    def get_row_values(self,r):
+        """
+        Read values and types of row r at once, instead of create one Cell
+        object per cell, and convert only cells of read columns whose type
+        need it.
+        """
+        if self._columns is None:
+            self.set_columns()
+        values = self._reader.row_values(r)
+        types = self._reader.row_types(r)
+        converters = self._converters
+        size = len(values)
+        for c in self._columns:
+            if c < size and types[c] in converters:
+                values[c] = converters[types[c]](values[c])
+        return values
 
     def get_items(self):
+        skip = self.pop_skip()
         for r in range(1,self.nrows):
-            values = [self.get_value(self._reader.cell(r,c)) for c in range(self.ncols)]
+            if skip:
+                if any(self._reader.row_values(r)):
+                    skip -= 1
+                continue
+            values = self.get_row_values(r)
             if not any(values): continue # empty lines are ignored
             yield self.get_item(values)
 
 class XLSXReader(XLSReader):
+    def __init__(self,f,**kwargs):
+        # streaming=True use openpyxl iterators, so sheet XML is parsed while
+        # we read rows instead of load all cells in memory before first row.
+        self._streaming = kwargs.pop('streaming',False)
+        super(XLSXReader,self).__init__(f,**kwargs)
 
     def set_reader(self):
-        self._workbook = openpyxl.reader.excel.load_workbook(self._source)
+        self._workbook = openpyxl.reader.excel.load_workbook(self._source,use_iterators=self._streaming)
         if self._sheet_name:
             self._reader = self._workbook.worksheets[self._workbook.get_sheet_names().index(self._sheet_name)]
         else:
             self._reader = self._workbook.worksheets[0]
 
+        if self._streaming:
+            self._rows = self._reader.iter_rows()
+
     @property
     def headers(self):
         if not self._headers:
-            self._headers = map(self.normalize_string,[c.value for c in self._reader.rows[0]])
+            if self._streaming:
+                self._headers = map(self.normalize_string,[c.internal_value for c in self._rows.next()])
+            else:
+                self._headers = map(self.normalize_string,[c.value for c in self._reader.rows[0]])
         return self._headers
 
     def get_value(self,item,**kwargs):
         """
         Handle different value types for XLSX. Item is a cell object.
         """
+        if self._streaming:
+            return self.get_raw_value(item)
+
         # Thx to Augusto C Men to point fast solution for XLS/XLSX dates
         if item.is_date() and isinstance(item,(int,float)):
             return datetime.date(1899,12,30) + datetime.timedelta(days=item)
@@ -87,10 +134,39 @@ class XLSXReader(XLSReader):
                 return ''
         return item.value
 
+    def get_raw_value(self,item):
+        """
+        Handle values of cells read by openpyxl iterators. Item is a RawCell
+        that already have value converted to string, bool, date or float.
+        """
+        value = item.internal_value
+        if value is None:
+            return ''
+        if isinstance(value,float) and value % 1 == 0: # integers
+            return int(value)
+        return value
+
     def get_items(self):
-        for row in self._reader.rows[1:]:
-            values = [self.get_value(c) for c in list(row)]
-            if not any(values): continue # empty lines are ignored
+        if self._streaming:
+            rows = self._rows
+        else:
+            rows = self._reader.rows[1:]
+
+        if self._columns is None:
+            self.set_columns()
+        columns = self._columns
+        attr = 'internal_value' if self._streaming else 'value'
+        skip = self.pop_skip()
+        for row in rows:
+            # empty lines are ignored, values of all columns are checked so
+            # line numbers don't depend of read columns
+            if not any([getattr(c,attr) for c in row]): continue
+            if skip:
+                skip -= 1
+                continue
+            size = len(row)
+            values = [None] * size
+            for c in columns:
+                if c < size:
+                    values[c] = self.get_value(row[c])
             yield self.get_item(values)
-
-
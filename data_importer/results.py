@@ -0,0 +1,67 @@
+# coding: utf-8
+"""
+Stores for results of BaseImporter._clean, one for each value of
+BaseImporter.keep_validation_results.
+"""
+from django.utils.datastructures import SortedDict
+
+KEEP_ALL = 'all' # keep cleaned rows, as always did
+KEEP_FLAGS = 'flags' # keep only if line is valid or not
+KEEP_NONE = 'none' # keep nothing
+
+class ValidationFlags(object):
+    """
+    Keep only if each line is valid or not, one byte per line. get() returns
+    False for invalid lines and None for valid ones, since their cleaned
+    rows aren't kept and should be cleaned again.
+    """
+    UNKNOWN, VALID, INVALID = 0, 1, 2
+
+    def __init__(self):
+        self._flags = bytearray()
+
+    def __setitem__(self,i,result):
+        if i >= len(self._flags):
+            self._flags.extend(bytearray(i - len(self._flags) + 1))
+        self._flags[i] = self.INVALID if result is False else self.VALID
+
+    def __getitem__(self,i):
+        if i not in self:
+            raise KeyError(i)
+        return self._flags[i] == self.VALID
+
+    def __contains__(self,i):
+        return i < len(self._flags) and self._flags[i] != self.UNKNOWN
+
+    def __len__(self):
+        return len(self._flags) - self._flags.count(self.UNKNOWN)
+
+    def get(self,i,default=None):
+        if i in self and self._flags[i] == self.INVALID:
+            return False
+        return default
+
+class NoValidationResults(object):
+    """
+    Keep nothing, lines are always cleaned again.
+    """
+    def __setitem__(self,i,result):
+        pass
+
+    def __getitem__(self,i):
+        raise KeyError(i)
+
+    def __contains__(self,i):
+        return False
+
+    def __len__(self):
+        return 0
+
+    def get(self,i,default=None):
+        return default
+
+RESULTS_STORES = {
+    KEEP_ALL: SortedDict,
+    KEEP_FLAGS: ValidationFlags,
+    KEEP_NONE: NoValidationResults,
+}
@@ -0,0 +1,50 @@
+# coding: utf-8
+import cPickle as pickle
+import tempfile
+
+class RowSpool(object):
+    """
+    Temporary file that keep (line, result) pairs of a validation pass, so
+    rows can be read again without read and clean the source file again.
+
+    Pairs are pickled in chunks of chunk_size, so memory used is bounded by
+    chunk size and headers of rows are pickled once per chunk.
+    """
+
+    def __init__(self,chunk_size=1000):
+        self.chunk_size = chunk_size
+        self.complete = False
+        self._file = tempfile.TemporaryFile()
+        self._chunk = []
+
+    def append(self,i,result):
+        self._chunk.append((i,result))
+        if len(self._chunk) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        if self._chunk:
+            pickle.dump(self._chunk,self._file,pickle.HIGHEST_PROTOCOL)
+            self._chunk = []
+
+    def finish(self):
+        """
+        Should be called after last line is appended.
+        """
+        self._flush()
+        self._file.flush()
+        self.complete = True
+
+    def __iter__(self):
+        assert self.complete,u"Spool can't be read before finish()"
+        self._file.seek(0)
+        while True:
+            try:
+                chunk = pickle.load(self._file)
+            except EOFError:
+                break
+            for item in chunk:
+                yield item
+
+    def close(self):
+        self._file.close()
@@ -1,16 +1,32 @@
 """
 
 """
+import logging
 import os
+import tempfile
+import threading
+from decimal import Decimal
+from Queue import Queue
 import data_importer
-from django.test import TestCase
+from data_importer import model_importer
+from django.db import DatabaseError
+from django.test import TestCase, TransactionTestCase
 from data_importer.tests.cpfcnpj import CPF
 from data_importer.tests.importers import BaseImportWithFields, SimpleValidationsImporter, RequiredFieldValidationsImporter,\
-    SimpleValidationsImporterDB, RequiredFieldValidationsImporterDB
+    SimpleValidationsImporterDB, RequiredFieldValidationsImporterDB, ParallelValidationsImporter,\
+    ThreadedValidationsImporter, ThreadedSaveImporter, BatchValidationsImporter,\
+    LookupImporter, UniqueImporter, QuoteImporter, QuoteUpsertImporter,\
+    StagedQuoteImporter, CheckpointQuoteImporter
 from django.utils.datastructures import SortedDict
 from data_importer.tests.mocks import MockLoggingHandler
-from data_importer.handlers import DBLoggingHandler
-from data_importer.tests.models import Error
+from data_importer.handlers import DBLoggingHandler, BufferedDBLoggingHandler, QueueHandler, QueueListener, OVERFLOW_DROP
+from data_importer.tests.models import Error, Person, Quote
+from data_importer.exceptions import CoercionError
+from data_importer.checkpoints import Checkpoint, FileCheckpointStore, file_fingerprint
+from data_importer.models import ImportCheckpoint
+from data_importer.results import KEEP_ALL, KEEP_FLAGS, KEEP_NONE
+from data_importer.unique import UniqueIndex
+from data_importer.metrics import Metrics
 
 def setUpClassData(klass):
     """
@@ -79,6 +95,103 @@ class ReaderTest(TestCase):
         reader = data_importer.readers.CSVReader(self.files['csv_sheet'])
         self.compare_lines([line for line in reader])
 
+    def test_csv_declared_types(self):
+        reader = data_importer.readers.CSVReader(self.files['csv_sheet'],types={'cpf':'text'})
+        lines = [line for line in reader]
+        self.assertEquals(u'96177843514',lines[2]['cpf'])
+        self.assertEquals('text',reader.column_types['cpf'])
+        self.assertEquals('auto',reader.column_types['field3'])
+
+    def test_csv_inferred_types(self):
+        reader = data_importer.readers.CSVReader(self.files['csv_sheet'],infer_types=10)
+        lines = [line for line in reader]
+        self.assertEquals('text',reader.column_types['cpf'])
+        self.assertEquals(u'87894839957',lines[3]['cpf'])
+        self.assertEquals(5,len(lines))
+
+    def test_csv_strict_types(self):
+        reader = data_importer.readers.CSVReader(self.files['csv_sheet'],types={'cpf':'int'},strict=True)
+        try:
+            [line for line in reader]
+        except CoercionError, err:
+            self.assertEquals(1,err.line)
+            self.assertEquals('cpf',err.column)
+        else:
+            self.fail(u"CSVReader in strict mode should raise CoercionError")
+
+    def test_skip(self):
+        for name,reader in (('csv_sheet',data_importer.readers.CSVReader),
+                ('xls_sheet',data_importer.readers.XLSReader),('xlsx_sheet',data_importer.readers.XLSXReader)):
+            reader = reader(self.files[name])
+            reader.skip(3)
+            self.assertEquals(self.f_data[3:],list(reader),u"%s didn't skip 3 lines" % name)
+
+    def test_skip_custom_reader(self):
+        class ListReader(data_importer.readers.CSVReader):
+            # custom get_items that doesn't know about skip
+            def get_items(self):
+                for row in self._reader:
+                    yield self.get_item(row)
+        rows = list(ListReader(self.files['csv_sheet']))
+        reader = ListReader(self.files['csv_sheet'])
+        reader.skip(3)
+        self.assertEquals(rows[3:],list(reader))
+
+    def write_csv(self,text,encoding):
+        fd,path = tempfile.mkstemp(suffix='.csv')
+        os.write(fd,text.encode(encoding))
+        os.close(fd)
+        self.addCleanup(os.remove,path)
+        return path
+
+    def test_csv_encodings(self):
+        text = u"C\xf3digo;Descri\xe7\xe3o\n1;P\xe3o de queijo\n2;A\xe7a\xed\n"
+        for encoding,detected in (('utf-8','utf-8'),('cp1252','cp1252'),('utf-8-sig','utf-8-sig'),('utf-16','utf-16')):
+            reader = data_importer.readers.CSVReader(self.write_csv(text,encoding))
+            self.assertEquals(detected,reader.encoding)
+            self.assertEquals(['codigo','descricao'],reader.headers)
+            self.assertEquals([{'codigo':1,'descricao':u'P\xe3o de queijo'},{'codigo':2,'descricao':u'A\xe7a\xed'}],list(reader),
+                u"Wrong values for %s file" % encoding)
+
+    def test_csv_ascii_sample(self):
+        # first 64KB are ASCII, cp1252 bytes come later
+        path = self.write_csv(u"name\n" + u"Joao\n" * 20000 + u"Jo\xe3o\nCora\xe7\xe3o\n",'cp1252')
+        reader = data_importer.readers.CSVReader(path)
+        self.assertEquals('utf-8',reader.encoding)
+        self.assertEquals([{'name':u'Jo\xe3o'},{'name':u'Cora\xe7\xe3o'}],list(reader)[-2:])
+        # first row that isn't UTF-8 switches file to cp1252
+        self.assertEquals('cp1252',reader.encoding)
+        path = self.write_csv(u"name\n" + u"Joao\n" * 20000 + u"Jo\xe3o\n",'utf-8')
+        reader = data_importer.readers.CSVReader(path)
+        self.assertEquals([{'name':u'Jo\xe3o'}],list(reader)[-1:])
+        self.assertEquals('utf-8',reader.encoding)
+
+    def test_csv_utf8_sample_strict(self):
+        # sample is UTF-8, so a cp1252 byte later is a corrupt file
+        text = u"name\nJo\xe3o\n" + u"Joao\n" * 20000
+        path = self.write_csv(text,'utf-8')
+        f = open(path,'ab')
+        f.write(u"Cora\xe7\xe3o\n".encode('cp1252'))
+        f.close()
+        reader = data_importer.readers.CSVReader(path)
+        self.assertEquals('utf-8',reader.encoding)
+        self.assertRaises(UnicodeDecodeError,list,reader)
+        reader = data_importer.readers.CSVReader(path,encoding_errors='replace')
+        self.assertEquals([{'name':u'Cora\ufffd\ufffdo'}],list(reader)[-1:])
+
+    def test_csv_explicit_encoding(self):
+        path = self.write_csv(u"name\nJo\xe3o\n",'latin-1')
+        reader = data_importer.readers.CSVReader(path,encoding='latin-1')
+        self.assertEquals([{'name':u'Jo\xe3o'}],list(reader))
+
+    def test_set_fields(self):
+        for name,reader in (('csv_sheet',data_importer.readers.CSVReader),
+                ('xls_sheet',data_importer.readers.XLSReader),('xlsx_sheet',data_importer.readers.XLSXReader)):
+            reader = reader(self.files[name])
+            reader.set_fields(['cpf','field4'])
+            self.assertEquals([dict([(k,row[k]) for k in ('cpf','field4')]) for row in self.f_data],list(reader),
+                u"%s didn't read only cpf and field4" % name)
+
     def test_xls_reader(self):
         """
         Compare data return by CSVReader from csv_sheet.csv file to know data
@@ -103,6 +216,43 @@ class ReaderTest(TestCase):
         reader = data_importer.readers.XLSXReader(self.files['xlsx_sheet'])
         self.compare_lines([line for line in reader])
 
+    def test_xlsx_streaming_reader(self):
+        reader = data_importer.readers.XLSXReader(self.files['xlsx_sheet'],streaming=True)
+        [line for line in reader]
+        self.assertEquals(self.f_headers,reader.headers)
+
+    def test_xlsx_streaming_lines(self):
+        reader = data_importer.readers.XLSXReader(self.files['xlsx_sheet'],streaming=True)
+        self.compare_lines([line for line in reader])
+
+class RowTest(TestCase):
+
+    def setUp(self):
+        setUpClassData(self)
+
+    def test_row_shares_header_index(self):
+        reader = data_importer.readers.CSVReader(self.files['csv_sheet'])
+        lines = [line for line in reader]
+        self.assertTrue(isinstance(lines[0],data_importer.readers.Row))
+        self.assertTrue(lines[0]._index is lines[1]._index)
+        self.assertEquals(self.f_headers,lines[0].keys())
+        self.assertEquals(self.f_data[0],lines[0])
+
+    def test_row_copy_on_write(self):
+        reader = data_importer.readers.CSVReader(self.files['csv_sheet'])
+        row = iter(reader).next()
+        copy = row.copy()
+        self.assertTrue(row._values is copy._values)
+        copy['cpf'] = u'changed'
+        copy['_i'] = 1
+        self.assertEquals(u'437.692.351-69',row['cpf'])
+        self.assertEquals(u'changed',copy['cpf'])
+        self.assertTrue('_i' not in row)
+        self.assertEquals(1,copy['_i'])
+        del copy['field3']
+        self.assertEquals(['cpf','field4','field5','_i'],copy.keys())
+        self.assertTrue('field3' in row)
+
 class BaseImporterTests(TestCase):
 
     def setUp(self):
@@ -158,6 +308,16 @@ class BaseImporterTests(TestCase):
             self.assertTrue(i.__class__.__name__ not in instances,u"More than one logger with same class found in importer.logger.handlers")
             instances.append(i.__class__.__name__)
 
+    def test_validation_plan(self):
+        plan = RequiredFieldValidationsImporter.get_validation_plan()
+        self.assertEquals((('cpf',True,'clean_cpf'),('field3',True,None),('field4',False,None),('field5',False,None)),plan)
+        self.assertTrue(plan is RequiredFieldValidationsImporter.get_validation_plan())
+
+    def test_validation_plan_bound_cleaners(self):
+        importer = SimpleValidationsImporter(self.files['csv_sheet'])
+        self.assertEquals(importer.clean_cpf,importer.validation_plan[0][2])
+        self.assertEquals([None,None,None],[cleaner for field,required,cleaner in importer.validation_plan[1:]])
+
 class ImportersValidationsTests(TestCase):
     """
     This test will test other importers that should validate data.
@@ -195,6 +355,38 @@ class ImportersValidationsTests(TestCase):
                 self.assertEquals(True,k in self.invalid_lines[i])
                 self.assertEquals(self.invalid_lines[i][k],v)
 
+    def test_errors_are_per_instance(self):
+        importer = SimpleValidationsImporter(self.files['csv_invalid_cpf_sheet'])
+        other = SimpleValidationsImporter(self.files['csv_sheet'])
+        self.assertTrue(not importer.is_valid(),u"Should return False to is_valid()")
+        self.assertTrue(other.is_valid(),u"Errors of other importer shouldn't be shared")
+
+    def test_errors_limit(self):
+        importer = RequiredFieldValidationsImporter(self.files['csv_invalid_cpf_sheet'])
+        importer.max_error_lines = 1
+        self.assertTrue(not importer.is_valid(),u"Should return False to is_valid()")
+        self.assertEquals([1],importer.errors.keys())
+        self.assertEquals([1,2,3],list(importer.errors.failed_lines()))
+        self.assertTrue(importer.errors.has_line(3))
+        self.assertEquals(2,importer.errors.counts[('cpf',u'Invalid CPF number.')])
+        self.assertTrue(importer.errors[1]['cpf'][0] is importer.errors.intern(u'Field cpf is required!'))
+
+    def test_line_validation(self):
+        for policy in (KEEP_ALL,KEEP_FLAGS,KEEP_NONE):
+            klass = type('SimpleValidationsImporter',(SimpleValidationsImporter,),{'keep_validation_results':policy})
+            importer = klass(self.files['csv_invalid_cpf_sheet'])
+            self.assertTrue(not importer.is_valid(),u"Should return False to is_valid()")
+            self.assertEquals([True,False,False,True,True],[importer.is_valid(i) for i in range(1,6)],
+                u"Wrong line validation with %s policy" % policy)
+
+    def test_validation_flags(self):
+        klass = type('SimpleValidationsImporter',(SimpleValidationsImporter,),{'keep_validation_results':KEEP_FLAGS})
+        importer = klass(self.files['csv_invalid_cpf_sheet'])
+        importer.is_valid()
+        self.assertEquals(False,importer._validation_results[2])
+        self.assertEquals(True,importer._validation_results[1])
+        self.assertEquals(None,importer._validation_results.get(1))
+
     def test_invalid_errors_in_logging(self):
         importer = SimpleValidationsImporter(self.files['csv_invalid_cpf_sheet'])
         self.assertTrue(not importer.is_valid(),u"Should return False to is_valid()")
@@ -215,6 +407,104 @@ class ImportersValidationsTests(TestCase):
         self.assertTrue(u"SimpleValidationsImporterDB_importer :: error :: Line 3, field cpf: Invalid CPF number." in \
             str(errors[1]),u"Weird string for this test, check loggers.")
 
+    def test_buffered_logging_to_DB(self):
+        def get_logger_handlers(self):
+            # thresholds aren't reached, records are written by save_all
+            return [(BufferedDBLoggingHandler,(),{'model':Error,'capacity':1000,'flush_interval':None})]
+        BufferedImporter = type('BufferedImporter',(SimpleValidationsImporter,),{'get_logger_handlers':get_logger_handlers})
+        importer = BufferedImporter(self.files['csv_invalid_cpf_sheet'])
+        self.assertNumQueries(1,importer.save_all)
+        self.assertEquals([logging.INFO] * 3 + [logging.ERROR] * 2,sorted([e.levelno for e in Error.objects.all()]))
+
+    def test_buffered_logging_stops_thread(self):
+        def get_logger_handlers(self):
+            return [(BufferedDBLoggingHandler,(),{'model':Error,'capacity':1000,'flush_interval':None})]
+        BufferedImporter = type('BufferedImporter',(SimpleValidationsImporter,),{'get_logger_handlers':get_logger_handlers})
+        BufferedImporter(self.files['csv_invalid_cpf_sheet']).save_all()
+        count = threading.active_count()
+        # each importer closes handler and thread of the previous one
+        for n in range(3):
+            BufferedImporter(self.files['csv_invalid_cpf_sheet']).save_all()
+        self.assertEquals(count,threading.active_count())
+        handler = BufferedImporter(self.files['csv_invalid_cpf_sheet']).logger.handlers[0]
+        self.assertEquals(count - 1,threading.active_count())
+        handler.close()
+
+    def test_buffered_logging_keeps_failed_records(self):
+        handler = BufferedDBLoggingHandler(model=Error,capacity=1000,flush_interval=None)
+        logger = logging.Logger('buffered_test')
+        logger.addHandler(handler)
+        logger.error(u"first")
+        logger.error(u"second")
+        bulk_create = Error.objects.bulk_create
+        def fail(objs):
+            raise DatabaseError(u"database is locked")
+        Error.objects.bulk_create = fail
+        try:
+            self.assertRaises(DatabaseError,handler.flush)
+        finally:
+            Error.objects.bulk_create = bulk_create
+        self.assertEquals(2,len(handler.buffer))
+        handler.close()
+        self.assertEquals([u"first",u"second"],[e.msg for e in Error.objects.order_by('id')])
+
+    def test_queued_logging(self):
+        QueuedImporter = type('QueuedImporter',(SimpleValidationsImporter,),{'log_queue_size':100})
+        importer = QueuedImporter(self.files['csv_invalid_cpf_sheet'])
+        self.assertTrue(isinstance(importer.logger.handlers[0],QueueHandler))
+        importer.save_all()
+        # save_all waits queued records
+        handler = importer.logger.handlers[0].listener.handlers[0]
+        self.assertEquals(self.logger_error_messages,handler.messages['error'])
+        self.assertEquals(3,len(handler.messages['info']))
+
+    def test_queued_logging_closes_handlers(self):
+        def get_logger_handlers(self):
+            return [(BufferedDBLoggingHandler,(),{'model':Error,'capacity':1000,'flush_interval':None})]
+        QueuedImporter = type('BufferedQueuedImporter',(SimpleValidationsImporter,),
+            {'log_queue_size':100,'get_logger_handlers':get_logger_handlers})
+        count = threading.active_count()
+        importer = QueuedImporter(self.files['csv_invalid_cpf_sheet'])
+        importer.save_all()
+        importer.logger.handlers[0].close()
+        # listener and writer thread of buffered handler are stopped
+        self.assertEquals(count,threading.active_count())
+
+    def test_queue_overflow(self):
+        queue = Queue(2)
+        mock = MockLoggingHandler()
+        listener = QueueListener(queue,mock)
+        handler = QueueHandler(queue,OVERFLOW_DROP,listener=listener)
+        logger = logging.Logger('test_queue_overflow')
+        logger.addHandler(handler)
+        for i in range(5):
+            logger.info(u"Line %s saved successfully",i)
+        self.assertEquals(3,handler.dropped)
+        listener.start()
+        handler.flush()
+        self.assertEquals([u"Line 0 saved successfully",u"Line 1 saved successfully"],mock.messages['info'])
+        self.assertEquals([u"3 log records dropped because log queue was full."],mock.messages['warning'])
+        handler.close()
+
+    def test_aggregate_logging(self):
+        AggregateImporter = type('AggregateImporter',(SimpleValidationsImporter,),{'log_aggregate':2})
+        importer = AggregateImporter(self.files['csv_invalid_cpf_sheet'])
+        importer.save_all()
+        handler = importer.logger.handlers[0]
+        self.assertEquals([],handler.messages['error'])
+        self.assertEquals([u"Lines 1 to 2: 1 valid, 1 invalid, 0 empty, 1 saved",
+            u"Lines 3 to 4: 1 valid, 1 invalid, 0 empty, 1 saved",
+            u"Lines 5 to 5: 1 valid, 0 invalid, 0 empty, 1 saved"],handler.messages['info'])
+        self.assertEquals([2,3],importer.errors.keys())
+
+    def test_disabled_log_level(self):
+        importer = SimpleValidationsImporter(self.files['csv_invalid_cpf_sheet'])
+        importer.logger.setLevel(logging.CRITICAL)
+        importer.save_all()
+        self.assertEquals([],importer.logger.handlers[0].messages['error'])
+        self.assertEquals([],importer.logger.handlers[0].messages['info'])
+        self.assertEquals([2,3],importer.errors.keys())
+
     def test_invalid_required_field(self):
         # invalid lines for RequiredFieldValidationsImporter includes line 1 :)
         invalid_lines = self.invalid_lines.copy()
@@ -268,3 +558,318 @@ class ImportersValidationsTests(TestCase):
                         v = CPF(v)
                     self.assertEquals(True,k in data)
                     self.assertEquals(data[k],v)
+
+    def test_save_from_spool(self):
+        klass = type('RequiredFieldValidationsImporter',(RequiredFieldValidationsImporter,),
+            {'spool_validated_rows':True,'keep_validation_results':KEEP_NONE})
+        importer = klass(self.files['csv_invalid_cpf_sheet'])
+        self.assertTrue(not importer.is_valid(),u"Should return False to is_valid()")
+        spool_file = importer._spool._file
+        results = importer.save_all()
+        # spool is removed once save_all read it
+        self.assertEquals(None,importer._spool)
+        self.assertTrue(spool_file.closed)
+        self.assertEquals(5,len(results))
+        self.assertEquals([None,None,None],results[:3])
+        self.assertEquals(CPF(u'87894839957'),results[3]['cpf'])
+        self.assertEquals(4,results[3]['_i'])
+        self.assertEquals(self.data_invalid[4]['field3'],results[4]['field3'])
+
+    def test_parallel_validation(self):
+        serial = RequiredFieldValidationsImporter(self.files['csv_invalid_cpf_sheet'])
+        importer = ParallelValidationsImporter(self.files['csv_invalid_cpf_sheet'])
+        self.assertTrue(not importer.is_valid(),u"Should return False to is_valid()")
+        serial.is_valid()
+        self.assertEquals(serial.errors,importer.errors)
+        self.assertEquals(list(serial.errors.failed_lines()),list(importer.errors.failed_lines()))
+        self.assertEquals(serial.logger.handlers[0].messages['error'],importer.logger.handlers[0].messages['error'])
+        self.assertEquals(serial._validation_results,importer._validation_results)
+
+    def test_threaded_validation(self):
+        serial = RequiredFieldValidationsImporter(self.files['csv_invalid_cpf_sheet'])
+        importer = ThreadedValidationsImporter(self.files['csv_invalid_cpf_sheet'])
+        serial_results = serial.save_all()
+        results = importer.save_all()
+        self.assertEquals(serial.errors,importer.errors)
+        self.assertEquals(serial.logger.handlers[0].messages['error'],importer.logger.handlers[0].messages['error'])
+        self.assertEquals(len(serial_results),len(results))
+        for serial_row,row in zip(serial_results,results):
+            if serial_row is None:
+                self.assertEquals(None,row)
+            else:
+                self.assertEquals(serial_row['_i'],row['_i'])
+                self.assertEquals(serial_row['cpf'],row['cpf'])
+                self.assertEquals(serial_row['field4'].upper(),row['field4'])
+
+    def test_threaded_save(self):
+        count = threading.active_count()
+        importer = ThreadedSaveImporter(self.files['csv_invalid_cpf_sheet'])
+        results = list(importer.save_all_iter())
+        self.assertEquals([None,None,None,4,5],[row and row['_i'] for row in results])
+        # pool threads were joined
+        self.assertEquals(count,threading.active_count())
+
+    def test_threaded_save_aggregate_logging(self):
+        AggregateImporter = type('AggregateImporter',(ThreadedSaveImporter,),{'log_aggregate':2})
+        importer = AggregateImporter(self.files['csv_invalid_cpf_sheet'])
+        importer.save_all()
+        # saves end in reverse order, summaries keep line order
+        self.assertEquals([u"Lines 1 to 2: 0 valid, 2 invalid, 0 empty, 0 saved",
+            u"Lines 3 to 4: 1 valid, 1 invalid, 0 empty, 1 saved",
+            u"Lines 5 to 5: 1 valid, 0 invalid, 0 empty, 1 saved"],importer.logger.handlers[0].messages['info'])
+
+    def test_batch_validation(self):
+        serial = RequiredFieldValidationsImporter(self.files['csv_invalid_cpf_sheet'])
+        importer = BatchValidationsImporter(self.files['csv_invalid_cpf_sheet'])
+        serial_results = serial.save_all()
+        results = importer.save_all()
+        # line 1 have empty cpf, so it isn't sent to batch cleaner
+        self.assertEquals([[2,3],[4,5]],importer.batches)
+        self.assertEquals(serial.errors,importer.errors)
+        self.assertEquals(serial.logger.handlers[0].messages['error'],importer.logger.handlers[0].messages['error'])
+        self.assertEquals([row and row['cpf'] for row in serial_results],[row and row['cpf'] for row in results])
+
+    def test_lookup_fields(self):
+        palpatine = Person.objects.create(cpf=u'437.692.351-69')
+        ben = Person.objects.create(cpf=u'96177843514')
+        importer = LookupImporter(self.files['csv_sheet'])
+        # one query for each chunk of 3 lines
+        self.assertNumQueries(2,importer.is_valid)
+        self.assertEquals(palpatine,importer._validation_results[1]['cpf'])
+        self.assertEquals(ben,importer._validation_results[3]['cpf'])
+        self.assertEquals([2,4,5],importer.errors.keys())
+        self.assertEquals([u"person with cpf 541.903.660-64 doesn't exist."],importer.errors[2]['cpf'])
+
+    def test_metrics(self):
+        self.assertEquals(None,SimpleValidationsImporter(self.files['csv_sheet']).metrics)
+
+        def on_metrics(self,summary):
+            self.reports.append(summary)
+        MetricsImporter = type('MetricsImporter',(SimpleValidationsImporter,),
+            {'collect_metrics':True,'on_metrics':on_metrics,'reports':[]})
+        importer = MetricsImporter(self.files['csv_invalid_cpf_sheet'])
+        importer.save_all()
+        summary = importer.reports[-1]
+        self.assertEquals(5,summary['rows'])
+        self.assertEquals({'valid':3,'invalid':2,'empty':0,'saved':3},summary['counters'])
+        self.assertEquals(5,summary['stages']['clean_cpf']['calls'])
+        self.assertEquals(5,summary['stages']['get_item']['calls'])
+        for stage in ('parse','read','save','logging'):
+            self.assertTrue(stage in summary['stages'],u"Stage %s wasn't timed" % stage)
+
+    def test_metrics_from_threads(self):
+        metrics = Metrics()
+        def work():
+            for n in range(5000):
+                metrics.incr('saved')
+                metrics.add('save',0.001)
+        threads = [threading.Thread(target=work) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(20000,metrics.counters['saved'])
+        self.assertEquals(20000,metrics.stages['save'][1])
+
+    def test_read_fields_only(self):
+        ProjectedImporter = type('ProjectedImporter',(SimpleValidationsImporter,),
+            {'fields':['cpf','field3'],'read_fields_only':True})
+        importer = ProjectedImporter(self.files['csv_invalid_cpf_sheet'])
+        self.assertTrue(not importer.is_valid(),u"Should return False to is_valid()")
+        self.assertEquals([2,3],importer.errors.keys())
+        self.assertEquals(['cpf','field3','_i'],importer._validation_results[4].keys())
+        # line 1 have only field4, that isn't read
+        self.assertEquals(None,importer._validation_results.get(1))
+
+    def test_unique_together(self):
+        importer = UniqueImporter(self.files['csv_sheet'])
+        self.assertTrue(not importer.is_valid(),u"Should return False to is_valid()")
+        # line 1 have empty field3, lines 3 and 4 have same field3
+        self.assertEquals([4],importer.errors.keys())
+        self.assertEquals({'field3':[u'Duplicated field3, first seen in line 3.']},importer.errors[4])
+        self.assertTrue(importer.is_valid(3))
+
+    def test_unique_index_keys(self):
+        index = UniqueIndex()
+        first = Quote.objects.create(cpf=u'1')
+        second = Quote.objects.create(cpf=u'2')
+        # instances without __unicode__ have same repr, pk tells them apart
+        self.assertEquals(1,index.check((first,),1))
+        self.assertEquals(2,index.check((second,),2))
+        self.assertEquals(1,index.check((Quote.objects.get(pk=first.pk),),3))
+        self.assertEquals(4,index.check((Decimal('1.0'),u'a'),4))
+        self.assertEquals(4,index.check((Decimal('1'),'a'),5))
+        index.close()
+
+class ModelImporterTests(TestCase):
+
+    def setUp(self):
+        setUpClassData(self)
+
+    def test_bulk_save(self):
+        importer = QuoteImporter(self.files['csv_invalid_cpf_sheet'])
+        results = importer.save_all()
+        self.assertEquals([(1,[4],1,None),(2,[5],1,None)],[tuple(r) for r in results])
+        self.assertEquals([u'878.948.399-57',u'933.331.456-34'],[q.cpf for q in Quote.objects.order_by('cpf')])
+
+    def test_batch_transaction_on_routed_database(self):
+        class Router(object):
+            def db_for_write(self,model,**hints):
+                return 'default'
+        aliases = []
+        def recording_atomic(using=None):
+            aliases.append(using)
+            return atomic(using=using)
+        atomic = model_importer.atomic
+        routers = model_importer.router.routers
+        model_importer.atomic = recording_atomic
+        model_importer.router.routers = [Router()]
+        try:
+            QuoteImporter(self.files['csv_invalid_cpf_sheet']).save_all()
+        finally:
+            model_importer.atomic = atomic
+            model_importer.router.routers = routers
+        # transaction is opened in database chosen by router, not None
+        self.assertEquals(['default','default'],aliases)
+
+    def test_bulk_save_batch_error(self):
+        Quote.objects.create(cpf=u'933.331.456-34')
+        importer = QuoteImporter(self.files['csv_invalid_cpf_sheet'])
+        results = list(importer.save_all_iter())
+        self.assertEquals(None,results[0].error)
+        self.assertEquals([5],results[1].lines)
+        self.assertEquals(0,results[1].saved)
+        self.assertTrue(results[1].error is not None)
+        self.assertEquals(2,Quote.objects.count())
+
+    def test_upsert(self):
+        Quote.objects.create(cpf=u'933.331.456-34',field3=u'old quote')
+        Quote.objects.create(cpf=u'878.948.399-57',
+            field3=u'Ben (Obi-Wan) Kenobi: The Force can have a strong influence on a weak mind.')
+        importer = QuoteUpsertImporter(self.files['csv_invalid_cpf_sheet'])
+        # one query to find existing keys and one to update the changed line
+        results = []
+        self.assertNumQueries(2,lambda: results.extend(importer.save_all()))
+        self.assertEquals([(1,[4,5],1,None)],[tuple(r) for r in results])
+        self.assertEquals(2,Quote.objects.count())
+        self.assertEquals(u'lines 3 and 5 have invalid cpfs, line 2 have null cpf',
+            Quote.objects.get(cpf=u'933.331.456-34').field3)
+
+    def test_upsert_one_update_query(self):
+        Quote.objects.create(cpf=u'933.331.456-34',field3=u'old quote')
+        Quote.objects.create(cpf=u'878.948.399-57',field3=u'other old quote')
+        importer = QuoteUpsertImporter(self.files['csv_invalid_cpf_sheet'])
+        # changed lines are written by one UPDATE ... CASE query
+        results = []
+        self.assertNumQueries(2,lambda: results.extend(importer.save_all()))
+        self.assertEquals([(1,[4,5],2,None)],[tuple(r) for r in results])
+        self.assertEquals([u'Ben (Obi-Wan) Kenobi: The Force can have a strong influence on a weak mind.',
+            u'lines 3 and 5 have invalid cpfs, line 2 have null cpf'],
+            [q.field3 for q in Quote.objects.order_by('cpf')])
+
+    def test_upsert_key_fields_only(self):
+        Quote.objects.create(cpf=u'933.331.456-34',field3=u'old quote')
+        KeyOnlyImporter = type('KeyOnlyImporter',(QuoteUpsertImporter,),{'fields':['cpf'],'update_changed_only':False})
+        results = KeyOnlyImporter(self.files['csv_invalid_cpf_sheet']).save_all()
+        # existing line isn't updated nor counted, new one is inserted
+        self.assertEquals([(1,[4,5],1,None)],[tuple(r) for r in results])
+        self.assertEquals(2,Quote.objects.count())
+        self.assertEquals(u'old quote',Quote.objects.get(cpf=u'933.331.456-34').field3)
+
+    def test_resume_from_checkpoint(self):
+        def save_batch(self,objs):
+            if unicode(objs[0].cpf) == u'933.331.456-34':
+                raise RuntimeError(u"connection lost")
+            return QuoteImporter.save_batch(self,objs)
+        CrashImporter = type('CrashImporter',(CheckpointQuoteImporter,),{'save_batch':save_batch})
+        self.assertEquals(None,CrashImporter(self.files['csv_invalid_cpf_sheet']).save_all())
+        self.assertEquals([(4,1)],[(c.line,c.batch) for c in ImportCheckpoint.objects.all()])
+
+        importer = CheckpointQuoteImporter(self.files['csv_invalid_cpf_sheet'])
+        self.assertEquals([(2,[5],1,None)],[tuple(r) for r in importer.save_all()])
+        self.assertEquals(2,Quote.objects.count())
+        self.assertEquals(0,ImportCheckpoint.objects.count())
+
+    def test_file_checkpoint_store(self):
+        path = os.path.join(tempfile.mkdtemp(),'checkpoints.json')
+        store = FileCheckpointStore(path)
+        fingerprint = file_fingerprint(self.files['csv_sheet'])
+        self.assertEquals(None,store.load(fingerprint))
+        store.save(Checkpoint(fingerprint,1000,2))
+        self.assertEquals(Checkpoint(fingerprint,1000,2),FileCheckpointStore(path).load(fingerprint))
+        self.assertNotEquals(fingerprint,file_fingerprint(self.files['csv_invalid_cpf_sheet']))
+        store.clear(fingerprint)
+        self.assertEquals(None,store.load(fingerprint))
+
+    def test_fingerprint_whole_file(self):
+        directory = tempfile.mkdtemp()
+        names = []
+        for middle in 'ab':
+            name = os.path.join(directory,'%s.csv' % middle)
+            f = open(name,'wb')
+            f.write('x' * 100000 + middle + 'x' * 100000)
+            f.close()
+            names.append(name)
+        self.assertNotEquals(file_fingerprint(names[0]),file_fingerprint(names[1]))
+
+    def test_file_checkpoint_after_commit(self):
+        path = os.path.join(tempfile.mkdtemp(),'checkpoints.json')
+        class FailingCommit(object):
+            # second batch fails to commit
+            calls = []
+            def __enter__(self):
+                self.calls.append(1)
+            def __exit__(self,*exc_info):
+                if len(self.calls) == 2 and exc_info[0] is None:
+                    raise DatabaseError(u"commit failed")
+        FileImporter = type('FileImporter',(QuoteImporter,),{
+            'get_checkpoint_store':lambda self: FileCheckpointStore(path),'finish_checkpoints':lambda self: None})
+        atomic = model_importer.atomic
+        model_importer.atomic = lambda using=None: FailingCommit()
+        try:
+            results = FileImporter(self.files['csv_invalid_cpf_sheet']).save_all()
+        finally:
+            model_importer.atomic = atomic
+        self.assertTrue(results[1].error is not None)
+        self.assertEquals([[4,1]],FileCheckpointStore(path).read().values())
+
+class StagedImportTests(TransactionTestCase):
+    # sqlite commits before DDL, so staging table can't run inside TestCase transaction
+
+    def setUp(self):
+        setUpClassData(self)
+
+    def test_staged_upsert(self):
+        Quote.objects.create(cpf=u'437.692.351-69',field3=u'old quote')
+        importer = StagedQuoteImporter(self.files['csv_sheet'])
+        results = importer.save_all()
+        self.assertEquals([(1,[1,2,3,4,5],5,None)],[(r.number,list(r.lines),r.saved,r.error) for r in results])
+        self.assertEquals(5,Quote.objects.count())
+        self.assertEquals(u'',Quote.objects.get(cpf=u'437.692.351-69').field3)
+        self.assertEquals(u'some data for field 4',Quote.objects.get(cpf=u'541.903.660-64').field4)
+
+    def test_staged_invalid_file(self):
+        importer = StagedQuoteImporter(self.files['csv_invalid_cpf_sheet'])
+        results = importer.save_all()
+        self.assertEquals(0,results[0].saved)
+        self.assertTrue(results[0].error is not None)
+        self.assertEquals(0,Quote.objects.count())
+
+    def test_staged_after_is_valid(self):
+        importer = StagedQuoteImporter(self.files['csv_sheet'])
+        self.assertTrue(importer.is_valid())
+        results = importer.save_all()
+        self.assertEquals([(1,5,None)],[(r.number,r.saved,r.error) for r in results])
+        self.assertEquals(5,Quote.objects.count())
+
+    def test_staged_merge_error(self):
+        def merge_staged(self,cursor,stage,target,fields):
+            cursor.execute('INSERT INTO %s (cpf) SELECT cpf FROM %s' % (target,stage))
+            cursor.execute('SELECT * FROM missing_table')
+        BrokenImporter = type('BrokenImporter',(StagedQuoteImporter,),{'merge_staged':merge_staged})
+        results = BrokenImporter(self.files['csv_sheet']).save_all()
+        self.assertTrue(results[0].error is not None)
+        self.assertEquals(0,Quote.objects.count())
+        # staging table was dropped, next import can create it again
+        StagedQuoteImporter(self.files['csv_sheet']).save_all()
+        self.assertEquals(5,Quote.objects.count())
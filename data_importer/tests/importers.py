@@ -1,11 +1,14 @@
 # coding: utf-8
 # importers for tests
+import time
 
-from data_importer import BaseImporter, ValidationError
+from data_importer import BaseImporter, ModelImporter, ValidationError
 from data_importer.tests.cpfcnpj import CPF
 from data_importer.tests.mocks import MockLoggingHandler
 from data_importer.handlers import DBLoggingHandler
-from data_importer.tests.models import Error
+from data_importer.tests.models import Error, Person, Quote
+from data_importer.lookups import Lookup
+from data_importer.checkpoints import ModelCheckpointStore
 from django.utils.encoding import smart_unicode
 
 
@@ -72,4 +75,105 @@ class RequiredFieldValidationsImporterDB(RequiredFieldValidationsImporter):
     """
 
     def get_logger_handlers(self):
-        return [(DBLoggingHandler,(),{'model':Error})]
\ No newline at end of file
+        return [(DBLoggingHandler,(),{'model':Error})]
+
+class ParallelValidationsImporter(RequiredFieldValidationsImporter):
+    """
+    Same validations of RequiredFieldValidationsImporter, but lines are
+    cleaned by a pool of processes in small chunks.
+    """
+    processes = 2
+    chunk_size = 2
+
+class ThreadedValidationsImporter(RequiredFieldValidationsImporter):
+    """
+    Same validations of RequiredFieldValidationsImporter, but lines and
+    fields are cleaned by threads.
+    """
+    threads = 3
+    concurrent_fields = True
+    chunk_size = 2
+
+    def clean_field4(self,val,row):
+        # row should have not cleaned cpf, since fields are cleaned together
+        assert not isinstance(row['cpf'],CPF)
+        return val.upper()
+
+class ThreadedSaveImporter(RequiredFieldValidationsImporter):
+    """
+    Save lines in a pool of threads. Lines saved first wait more, so results
+    should be reordered.
+    """
+    save_threads = 3
+
+    def save(self,i,row):
+        time.sleep(0.01 * (5 - i))
+        return super(ThreadedSaveImporter,self).save(i,row)
+
+class BatchValidationsImporter(BaseImportWithFields):
+    """
+    Validate CPFs of a chunk at once, with same results of
+    RequiredFieldValidationsImporter.
+    """
+    required_fields = ['cpf','field3']
+    chunk_size = 3
+
+    def __init__(self,*args,**kwargs):
+        self.batches = []
+        super(BatchValidationsImporter,self).__init__(*args,**kwargs)
+
+    def clean_cpf_batch(self,values,lines):
+        self.batches.append(lines)
+        cleaned = []
+        for val in values:
+            try:
+                cleaned.append(CPF(val))
+            except ValueError,msg:
+                cleaned.append(ValidationError(smart_unicode(msg)))
+        return cleaned
+
+class LookupImporter(BaseImportWithFields):
+    """
+    cpf should be a Person cpf.
+    """
+    lookups = {'cpf': Lookup(Person,'cpf',cache_size=3)}
+    chunk_size = 3
+
+class UniqueImporter(BaseImportWithFields):
+    """
+    field3 should be unique, keeping only one key in memory.
+    """
+    unique_together = [('field3',),('cpf','field3')]
+    unique_index_size = 1
+
+class QuoteImporter(ModelImporter,RequiredFieldValidationsImporter):
+    """
+    Save valid lines to Quote model, in batches of 1 line.
+    """
+    model = Quote
+    batch_size = 1
+
+class QuoteUpsertImporter(QuoteImporter):
+    """
+    Update quotes that already exist, by cpf.
+    """
+    batch_size = 10
+    upsert = True
+    natural_key = ('cpf',)
+    update_changed_only = True
+
+class CheckpointQuoteImporter(QuoteImporter):
+    """
+    Save the last saved line in database, to resume failed imports.
+    """
+    def get_checkpoint_store(self):
+        return ModelCheckpointStore()
+
+class StagedQuoteImporter(ModelImporter,SimpleValidationsImporter):
+    """
+    Save all lines to Quote model through a staging table, or none of them.
+    """
+    model = Quote
+    staging = True
+    upsert = True
+    natural_key = ('cpf',)
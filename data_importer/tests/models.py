@@ -12,8 +12,8 @@ LOG_LEVELS = (
 
 class ErrorManager(models.Manager):
 
-    def create_from_record(self,record):
-        entry = Error(
+    def build_from_record(self,record):
+        return Error(
             logger=record.name,
             msg=record.getMessage(),
             levelno=record.levelno,
@@ -21,6 +21,9 @@ class ErrorManager(models.Manager):
             funcname=record.funcName,
             lineno=record.lineno
         )
+
+    def create_from_record(self,record):
+        entry = self.build_from_record(record)
         entry.save()
         return entry
 
@@ -41,4 +44,20 @@ class Error(models.Model):
             self.logger,
             self.get_levelno_display(),
             self.msg
-        )
\ No newline at end of file
+        )
+
+class Person(models.Model):
+    cpf = models.CharField(max_length=14,unique=True)
+    name = models.CharField(max_length=100,blank=True)
+
+    def __unicode__(self):
+        return self.cpf
+
+class Quote(models.Model):
+    cpf = models.CharField(max_length=14,unique=True)
+    field3 = models.TextField(blank=True)
+    field4 = models.TextField(blank=True)
+    field5 = models.TextField(blank=True)
+
+    def __unicode__(self):
+        return self.cpf
@@ -0,0 +1,104 @@
+# coding: utf-8
+import datetime
+import decimal
+import hashlib
+import sqlite3
+import struct
+from django.utils.encoding import smart_unicode
+
+def key_part(value):
+    """
+    Text that identify a cleaned value in a key: pk of model instances,
+    equal numbers (Decimal('1.0'), Decimal('1'), 1) give same text.
+    """
+    if value is None:
+        return u'none'
+    if hasattr(value,'_meta') and getattr(value,'pk',None) is not None:
+        return u'model:%s.%s:%s' % (value._meta.app_label,value._meta.object_name,smart_unicode(value.pk))
+    if isinstance(value,bool):
+        return u'bool:%s' % value
+    if isinstance(value,(int,long,float,decimal.Decimal)):
+        if isinstance(value,float):
+            value = decimal.Decimal(repr(value))
+        elif not isinstance(value,decimal.Decimal):
+            value = decimal.Decimal(value)
+        if value.is_finite() and value == value.to_integral_value():
+            return u'number:%d' % int(value)
+        return u'number:%s' % value.normalize()
+    if isinstance(value,(datetime.date,datetime.time)):
+        return u'%s:%s' % (value.__class__.__name__,value.isoformat())
+    # strings and other objects by their text, not repr with address
+    return u'text:%s' % smart_unicode(value)
+
+class UniqueIndex(object):
+    """
+    Index of keys seen in a file and the first line where each one was
+    seen, used to find duplicated keys.
+
+    Keys are kept as 64 bits hashes. After max_keys keys, hashes are moved
+    to a temporary sqlite database and a bloom filter of bloom_bits bits
+    tells which new keys don't need to be searched there, so memory doesn't
+    grow with file size.
+    """
+
+    def __init__(self,max_keys=100000,bloom_bits=2**23,hashes=4):
+        self.max_keys = max_keys
+        self.bloom_bits = bloom_bits
+        self.hashes = hashes
+        self._keys = {} # {hash: line}
+        self._db = None
+        self._bloom = None
+
+    def hash(self,key):
+        text = u'\x00'.join([key_part(value) for value in key])
+        return struct.unpack('<q',hashlib.md5(text.encode('utf-8')).digest()[:8])[0]
+
+    def check(self,key,line):
+        """
+        Return first line where key was seen. If key is new it's registered
+        as seen in line, so line is returned.
+        """
+        h = self.hash(key)
+        first = self._keys.get(h)
+        if first is not None:
+            return first
+        if self._db is not None and self._in_bloom(h):
+            found = self._db.execute('SELECT line FROM keys WHERE hash = ?',(h,)).fetchone()
+            if found:
+                return found[0]
+        self._keys[h] = line
+        if len(self._keys) >= self.max_keys:
+            self._spill()
+        return line
+
+    def _bloom_positions(self,h):
+        h1,h2 = h & 0xffffffff,(h >> 32) & 0xffffffff
+        return [(h1 + n * h2) % self.bloom_bits for n in range(self.hashes)]
+
+    def _in_bloom(self,h):
+        bloom = self._bloom
+        for pos in self._bloom_positions(h):
+            if not bloom[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def _spill(self):
+        if self._db is None:
+            # empty name is a temporary database, removed on close
+            self._db = sqlite3.connect('')
+            self._db.execute('CREATE TABLE keys (hash INTEGER PRIMARY KEY, line INTEGER)')
+            self._bloom = bytearray(self.bloom_bits // 8 + 1)
+        self._db.executemany('INSERT INTO keys VALUES (?, ?)',self._keys.iteritems())
+        self._db.commit()
+        bloom = self._bloom
+        for h in self._keys:
+            for pos in self._bloom_positions(h):
+                bloom[pos >> 3] |= 1 << (pos & 7)
+        self._keys = {}
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        self._bloom = None
+        self._keys = {}
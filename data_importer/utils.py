@@ -1,9 +1,61 @@
 # coding: utf-8
+import codecs
+
+# BOMs of UTF-32 start with BOMs of UTF-16, so they are tested first
+BOMS = (
+    (codecs.BOM_UTF32_LE,'utf-32'),
+    (codecs.BOM_UTF32_BE,'utf-32'),
+    (codecs.BOM_UTF8,'utf-8-sig'),
+    (codecs.BOM_UTF16_LE,'utf-16'),
+    (codecs.BOM_UTF16_BE,'utf-16'),
+)
+
+# encoding of files that aren't UTF-8, same first guess of to_unicode
+FALLBACK_ENCODING = 'cp1252'
+
+def detect_encoding(sample,fallback=FALLBACK_ENCODING):
+    """
+    Guess encoding of a file once, from a sample of its first bytes: BOM,
+    UTF-8 or fallback. Return None if sample is ASCII, that doesn't tell
+    encoding of the rest of file.
+    """
+    for bom,encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        sample.decode('ascii')
+        return None
+    except UnicodeDecodeError:
+        pass
+    try:
+        # not final, sample can end in the middle of a character
+        codecs.getincrementaldecoder('utf-8')().decode(sample,False)
+    except UnicodeDecodeError:
+        return fallback
+    return 'utf-8'
+
+def recode_lines(chunks,encoding,errors='strict'):
+    """
+    Decode byte chunks with an incremental decoder and yield its lines
+    encoded in UTF-8.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors)
+    pending = u''
+    for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).split(u'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield (line + u'\n').encode('utf-8')
+    pending += decoder.decode('',True)
+    if pending:
+        yield pending.encode('utf-8')
 
 def to_unicode(s):
     """
     Receive string s and try to return a utf-8 string.
     """
+    if isinstance(s,unicode):
+        return s
     try:
         return unicode(s.decode('cp1252'))
     except (UnicodeDecodeError,TypeError):
@@ -11,3 +63,55 @@ def to_unicode(s):
             return unicode(s.decode('ascii'))
         except (UnicodeDecodeError,TypeError):
             return unicode(s)
+
+
+class LRUCache(object):
+    """
+    Dict like cache that keep only the size most recently used keys.
+    """
+    # links are lists [prev, next, key, value]
+    PREV, NEXT, KEY, VALUE = 0, 1, 2, 3
+
+    def __init__(self,size):
+        self.size = size
+        self._links = {}
+        self._root = root = []
+        root[:] = [root,root,None,None]
+
+    def __contains__(self,key):
+        return key in self._links
+
+    def __len__(self):
+        return len(self._links)
+
+    def __getitem__(self,key):
+        link = self._links[key]
+        # move link to the most recent position
+        link[self.PREV][self.NEXT] = link[self.NEXT]
+        link[self.NEXT][self.PREV] = link[self.PREV]
+        root = self._root
+        last = root[self.PREV]
+        last[self.NEXT] = root[self.PREV] = link
+        link[self.PREV],link[self.NEXT] = last,root
+        return link[self.VALUE]
+
+    def __setitem__(self,key,value):
+        if key in self._links:
+            self[key] # move to most recent position
+            self._links[key][self.VALUE] = value
+            return
+        root = self._root
+        if len(self._links) >= self.size:
+            # drop least recently used key
+            oldest = root[self.NEXT]
+            oldest[self.NEXT][self.PREV] = root
+            root[self.NEXT] = oldest[self.NEXT]
+            del self._links[oldest[self.KEY]]
+        last = root[self.PREV]
+        link = [last,root,key,value]
+        last[self.NEXT] = root[self.PREV] = self._links[key] = link
+
+    def get(self,key,default=None):
+        if key in self._links:
+            return self[key]
+        return default
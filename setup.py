@@ -12,7 +12,7 @@ setup(
     mainteiner="Felipe 'chronos' Prenholato",
     mainteiner_email="philipe.rp@gmail.com",
     url="http://github.com/chronossc/django-data-importer",
-    packages = find_packages(exclude=('sampleprojet',)),
+    packages = find_packages(exclude=('sampleprojet','benchmarks')),
     description="Generic, easy to use, file reader and importer with validations like Django forms.",
     long_description="*data_importer* is a importer tool that allow you write "
         "your own importer, with validation for each field and line of imported "